@@ -0,0 +1,157 @@
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from cache import memoize
+from defaults import HEATMAP_MAX_CELLS
+from helpers import DistanceUnit, FuelUnit, Mileage, MileageUnit, convert_distance_values, convert_fuel_quantity_values, \
+                    convert_mileage_values
+from utils import calculate_yearly_fuel_price_array, solve_breakeven_km
+
+SCENARIO_COLUMNS = [
+    'hybrid_price', 'fuel_car_price', 'hybrid_mileage', 'fuel_car_mileage', 'mileage_unit',
+    'fuel_price', 'fuel_unit', 'annual_distance', 'distance_unit',
+]
+OPTIONAL_COLUMNS = {'pct_fuel_price_hike': 0.0}
+RESULT_COLUMNS = [
+    'hybrid_cost_per_km', 'fuel_car_cost_per_km', 'breakeven_km', 'breakeven_years', 'annual_savings',
+    'hike_breakeven_km', 'hike_breakeven_years', 'hike_fuel_price',
+]
+
+# Upper bound on the (scenarios x years) price matrix built per solver pass
+MAX_MATRIX_CELLS = 5_000_000
+
+
+def _as_units(values, unit_enum):
+    """Factorizes a unit column into integer codes and the unit enum for each code."""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object).reshape(-1))
+    return codes, [unit if isinstance(unit, unit_enum) else unit_enum(unit) for unit in uniques]
+
+
+def _convert_by_unit(values, units, target_unit, convert) -> np.ndarray:
+    """Converts each unit group with one array operation, rounding to 2 d.p. like the pydantic converters."""
+    codes, unit_list = units
+    result = np.asarray(values).astype(float)
+    for code, unit in enumerate(unit_list):
+        if unit != target_unit:
+            mask = codes == code
+            result[mask] = np.round(convert(result[mask], unit, target_unit), 2)
+    return result
+
+
+def standardize_mileage(mileage, units) -> np.ndarray:
+    with np.errstate(divide='ignore'):
+        return _convert_by_unit(mileage, units, MileageUnit.KMPL, convert_mileage_values)
+
+
+def standardize_distance(distance, units) -> np.ndarray:
+    return _convert_by_unit(distance, units, DistanceUnit.km, convert_distance_values)
+
+
+def fuel_price_per_litre(fuel_price, units) -> np.ndarray:
+    # Matches convert_fuel_price, which divides by the 2 d.p. litres in one unit
+    def convert(values, unit, target_unit):
+        return values / round(convert_fuel_quantity_values(1, unit, target_unit), 2)
+    return _convert_by_unit(fuel_price, units, FuelUnit.L, convert)
+
+
+def evaluate_scenarios(scenarios: Union[pd.DataFrame, Dict[str, np.ndarray]], max_years: int = 100) -> pd.DataFrame:
+    """Break-even results for many hybrid/fuel car pairs at once, one row per scenario.
+
+    `scenarios` holds the SCENARIO_COLUMNS, with unit columns as enums or their values. Distances are in
+    km and prices per litre. Rows where the hybrid is not both dearer and more efficient get NaN
+    break-evens, and a hike break-even beyond `max_years` is also NaN.
+    """
+    missing = [column for column in SCENARIO_COLUMNS if column not in scenarios]
+    if missing:
+        raise ValueError(f"Missing scenario columns: {missing}")
+    columns = {column: np.asarray(scenarios[column]).reshape(-1) for column in SCENARIO_COLUMNS}
+    num_scenarios = len(columns['hybrid_price'])
+    for column, default in OPTIONAL_COLUMNS.items():
+        columns[column] = np.asarray(scenarios[column], dtype=float).reshape(-1) if column in scenarios \
+                          else np.full(num_scenarios, default)
+
+    mileage_units = _as_units(columns['mileage_unit'], MileageUnit)
+    hybrid_kmpl = standardize_mileage(columns['hybrid_mileage'], mileage_units)
+    fuel_car_kmpl = standardize_mileage(columns['fuel_car_mileage'], mileage_units)
+    price_per_litre = fuel_price_per_litre(columns['fuel_price'], _as_units(columns['fuel_unit'], FuelUnit))
+    annual_km = standardize_distance(columns['annual_distance'], _as_units(columns['distance_unit'], DistanceUnit))
+    price_difference = columns['hybrid_price'].astype(float) - columns['fuel_car_price'].astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hybrid_cost_per_km = np.round(price_per_litre / hybrid_kmpl, 2)
+        fuel_car_cost_per_km = np.round(price_per_litre / fuel_car_kmpl, 2)
+        saving_per_km = fuel_car_cost_per_km - hybrid_cost_per_km
+        valid = (price_difference > 0) & (hybrid_kmpl > fuel_car_kmpl)
+        # Per-km costs that round to the same cent never break even
+        breakeven_km = np.where(valid & (saving_per_km > 0), price_difference / saving_per_km, np.nan)
+
+    hike_km, hike_year, hike_fuel_price = solve_hike_breakeven(price_difference, hybrid_kmpl, fuel_car_kmpl, price_per_litre,
+                                                               columns['pct_fuel_price_hike'], annual_km, valid, max_years)
+    hike_found = hike_year > 0
+
+    return pd.DataFrame({
+        'hybrid_cost_per_km': hybrid_cost_per_km,
+        'fuel_car_cost_per_km': fuel_car_cost_per_km,
+        'breakeven_km': breakeven_km,
+        'breakeven_years': breakeven_km / annual_km,
+        'annual_savings': np.where(valid, annual_km * saving_per_km, np.nan),
+        'hike_breakeven_km': np.where(hike_found, hike_km, np.nan),
+        'hike_breakeven_years': np.where(hike_found, np.round(hike_year - 1 + (hike_km % annual_km) / annual_km, 1), np.nan),
+        'hike_fuel_price': np.where(hike_found, hike_fuel_price, np.nan),
+    }, index=scenarios.index if isinstance(scenarios, pd.DataFrame) else None)
+
+
+def solve_hike_breakeven(price_difference, hybrid_kmpl, fuel_car_kmpl, price_per_litre, pct_fuel_price_hike,
+                         annual_km, valid, max_years: int):
+    """Vectorized calculate_breakeven_with_price_hike, in row chunks that keep the price matrix bounded."""
+    num_scenarios = len(price_difference)
+    km = np.zeros(num_scenarios, dtype=np.int64)
+    year = np.zeros(num_scenarios, dtype=np.int64)
+    fuel_price = np.zeros(num_scenarios)
+    rows = np.flatnonzero(valid)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        flat_breakeven_km = price_difference / (price_per_litre * (1 / fuel_car_kmpl - 1 / hybrid_kmpl))
+        num_years = np.ceil((np.floor(flat_breakeven_km) + 2) / annual_km)
+    num_years = np.clip(np.nan_to_num(num_years, nan=1, posinf=max_years), 1, max_years).astype(np.int64)
+
+    # Sorting by horizon keeps short and long horizons out of the same chunk
+    rows = rows[np.argsort(num_years[rows], kind='stable')]
+    chunk_size = max(1, MAX_MATRIX_CELLS // max_years)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        yearly_fuel_price = calculate_yearly_fuel_price_array(price_per_litre[chunk], pct_fuel_price_hike[chunk],
+                                                              int(num_years[chunk].max()))
+        km[chunk], year[chunk] = solve_breakeven_km(price_difference[chunk, None], hybrid_kmpl[chunk, None],
+                                                    fuel_car_kmpl[chunk, None], yearly_fuel_price, annual_km[chunk, None])
+        fuel_price[chunk] = yearly_fuel_price[np.arange(len(chunk)), np.maximum(year[chunk], 1) - 1]
+    return km, year, fuel_price
+
+
+@memoize(persist=True)
+def calculate_breakeven_grid(hybrid_price: float, hybrid_mileage: Mileage, fuel_car_price: float, fuel_car_mileage: Mileage,
+                             fuel_prices: tuple, fuel_unit: FuelUnit, annual_distances: tuple, distance_unit: DistanceUnit,
+                             pct_fuel_price_hike: float = 0.0) -> pd.DataFrame:
+    """Break-even years over fuel price x annual distance for one car pair, capped at HEATMAP_MAX_CELLS."""
+    if len(fuel_prices) * len(annual_distances) > HEATMAP_MAX_CELLS:
+        raise ValueError(f"Grid of {len(fuel_prices)}x{len(annual_distances)} exceeds {HEATMAP_MAX_CELLS} cells")
+    fuel_price, annual_distance = (values.ravel() for values in np.meshgrid(fuel_prices, annual_distances))
+    results = evaluate_scenarios({
+        'hybrid_price': np.full(len(fuel_price), hybrid_price),
+        'fuel_car_price': np.full(len(fuel_price), fuel_car_price),
+        'hybrid_mileage': np.full(len(fuel_price), hybrid_mileage.get_value_in(fuel_car_mileage.unit).value),
+        'fuel_car_mileage': np.full(len(fuel_price), fuel_car_mileage.value),
+        'mileage_unit': np.full(len(fuel_price), fuel_car_mileage.unit, dtype=object),
+        'fuel_price': fuel_price,
+        'fuel_unit': np.full(len(fuel_price), fuel_unit, dtype=object),
+        'annual_distance': annual_distance,
+        'distance_unit': np.full(len(fuel_price), distance_unit, dtype=object),
+        'pct_fuel_price_hike': np.full(len(fuel_price), pct_fuel_price_hike),
+    })
+    return pd.DataFrame({
+        'fuel_price': fuel_price,
+        'annual_distance': annual_distance,
+        'breakeven_years': results.hike_breakeven_years if pct_fuel_price_hike else results.breakeven_years.round(1),
+    })
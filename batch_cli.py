@@ -0,0 +1,84 @@
+"""Evaluate a CSV or Parquet file of scenarios in bounded memory.
+
+    python batch_cli.py scenarios.csv results.csv --chunk-size 100000 --workers 4
+
+Input columns are batch.SCENARIO_COLUMNS plus optional `pct_fuel_price_hike` and `currency`, with units
+given as their displayed values (e.g. "L/100km", "US Gal", "mi"). The file is read one chunk at a
+time and every output row holds its input row followed by the batch.RESULT_COLUMNS. Parquet input or
+output needs pyarrow.
+"""
+import argparse
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from batch import RESULT_COLUMNS, SCENARIO_COLUMNS, evaluate_scenarios
+from tabular_io import ChunkWriter, is_parquet, read_chunks
+
+
+def evaluate_chunk(chunk: pd.DataFrame, max_years: int) -> pd.DataFrame:
+    results = evaluate_scenarios(chunk, max_years=max_years)
+    return pd.concat([chunk.reset_index(drop=True), results[RESULT_COLUMNS].reset_index(drop=True)], axis=1)
+
+
+def run(input_path: str, output_path: str, chunk_size: int, workers: int = 1, max_years: int = 100, log=sys.stderr) -> int:
+    writer = ChunkWriter(output_path)
+    rows, started = 0, time.perf_counter()
+
+    def write(result: pd.DataFrame):
+        nonlocal rows
+        writer.write(result)
+        rows += len(result)
+        elapsed = time.perf_counter() - started
+        print(f"{rows:,} rows, {rows / max(elapsed, 1e-9):,.0f} rows/s", file=log)
+
+    try:
+        if workers <= 1:
+            for chunk in read_chunks(input_path, chunk_size):
+                write(evaluate_chunk(chunk, max_years))
+            return rows
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Results are written in input order and at most two chunks per worker are in flight
+            pending = deque()
+            for chunk in read_chunks(input_path, chunk_size):
+                pending.append(executor.submit(evaluate_chunk, chunk, max_years))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+        return rows
+    finally:
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('input', help="CSV or Parquet (.parquet/.pq) scenario file")
+    parser.add_argument('output', help="CSV or Parquet (.parquet/.pq) result file")
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--max-years', type=int, default=100, help="give up on fuel-hike break-evens beyond this")
+    args = parser.parse_args(argv)
+
+    if is_parquet(args.input) or is_parquet(args.output):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("Parquet files need pyarrow: pip install pyarrow")
+    header = next(read_chunks(args.input, 1), pd.DataFrame())
+    missing = [column for column in SCENARIO_COLUMNS if column not in header]
+    if missing:
+        parser.error(f"{args.input} is missing columns: {', '.join(missing)}")
+
+    started = time.perf_counter()
+    rows = run(args.input, args.output, args.chunk_size, args.workers, args.max_years)
+    elapsed = time.perf_counter() - started
+    print(f"Evaluated {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Headless timing and memory benchmarks for the conversions and break-even calculations.
+
+    python benchmark.py                                # run and print
+    python benchmark.py --output results.json          # also write machine-readable results
+    python benchmark.py --baseline benchmark_baseline.json   # flag regressions, exit 1 if any
+    python benchmark.py --save-baseline benchmark_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+from batch import evaluate_scenarios
+from defaults import CHART_MAX_POINTS, SETTINGS_MAP
+from fleet import calculate_fleet_comparison
+from helpers import Car, Distance, DistanceUnit, FuelPrice, FuelUnit, Mileage, MileageUnit, convert_fuel_price, \
+                    convert_mileage, convert_mileage_values
+from utils import calculate_breakeven_distance, calculate_breakeven_with_price_hike, calculate_detailed_cost, \
+                  calculate_per_km_cost
+
+# Memoized calculations are benchmarked through their uncached implementation
+calculate_per_km_cost = calculate_per_km_cost.__wrapped__
+calculate_breakeven_distance = calculate_breakeven_distance.__wrapped__
+calculate_breakeven_with_price_hike = calculate_breakeven_with_price_hike.__wrapped__
+calculate_detailed_cost = calculate_detailed_cost.__wrapped__
+calculate_fleet_comparison = calculate_fleet_comparison.__wrapped__
+
+# (currency, hybrid price, hybrid mileage, fuel car price, fuel car mileage) in the currency's default units
+CASES = {
+    'small': ('INR', 11_00_000, 25.0, 10_00_000, 15.0),
+    'typical': ('AUD', 45_000, 4.0, 40_000, 6.0),
+    # Near-identical mileages push break-even past two million km
+    'pathological': ('INR', 12_50_000, 20.5, 10_00_000, 20.0),
+}
+
+
+def make_case(name: str):
+    currency, hybrid_price, hybrid_mileage, fuel_car_price, fuel_car_mileage = CASES[name]
+    settings = SETTINGS_MAP[currency].model_copy(update={'sim_fuel_price_hike': True})
+    hybrid_car = Car(type='Hybrid_Car', price=hybrid_price, mileage=Mileage(value=hybrid_mileage, unit=settings.mileage_unit))
+    fuel_car = Car(type='Fuel_Car', price=fuel_car_price, mileage=Mileage(value=fuel_car_mileage, unit=settings.mileage_unit))
+    hybrid_car.cost_per_km = calculate_per_km_cost(hybrid_car, settings.fuel_price)
+    fuel_car.cost_per_km = calculate_per_km_cost(fuel_car, settings.fuel_price)
+    return fuel_car, hybrid_car, settings
+
+
+def cold_import(module: str):
+    """Imports `module` in a fresh interpreter, as a new server process or replica would."""
+    subprocess.run([sys.executable, '-c', f'import {module}'], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def measure(func: Callable, min_seconds: float = 0.2, max_calls: int = 100_000) -> Dict[str, float]:
+    """Best per-call time over repeated batches of calls, and the peak traced memory of a single call."""
+    # The first call's allocations depend on what ran before it, e.g. how full the interpreter's free
+    # lists are, so the traced call follows a warm-up call
+    func()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls, best = 1, float('inf')
+    started = time.perf_counter()
+    while time.perf_counter() - started < min_seconds:
+        batch_started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - batch_started) / calls)
+        calls = min(calls * 2, max_calls)
+    return {'seconds': best, 'peak_bytes': peak}
+
+
+def benchmarks() -> Dict[str, Callable]:
+    cases = {name: make_case(name) for name in CASES}
+    fuel_price = FuelPrice(value=4.4, per_unit=FuelUnit.USGa)
+    mileage = Mileage(value=4.0, unit=MileageUnit.L_100KM)
+    distance = Distance(value=13_500, unit=DistanceUnit.mi)
+    mileages = np.random.default_rng(0).uniform(3, 10, 1_000_000)
+
+    suite = {
+        'convert_fuel_price': lambda: convert_fuel_price(fuel_price, FuelUnit.UKGa),
+        'convert_mileage': lambda: convert_mileage(mileage, MileageUnit.MPG_US),
+        'distance_get_value_in': lambda: distance.get_value_in(DistanceUnit.km),
+        'convert_mileage_values_1m': lambda: convert_mileage_values(mileages, MileageUnit.L_100KM, MileageUnit.MPG_UK),
+    }
+    for name, (fuel_car, hybrid_car, settings) in cases.items():
+        suite[f'calculate_per_km_cost[{name}]'] = lambda car=hybrid_car, s=settings: calculate_per_km_cost(car, s.fuel_price)
+        suite[f'calculate_breakeven_distance[{name}]'] = lambda f=fuel_car, h=hybrid_car, s=settings: calculate_breakeven_distance(f, h, s)
+        suite[f'calculate_breakeven_with_price_hike[{name}]'] = lambda f=fuel_car, h=hybrid_car, s=settings: calculate_breakeven_with_price_hike(f, h, s)
+        suite[f'calculate_detailed_cost_segments[{name}]'] = lambda f=fuel_car, h=hybrid_car, s=settings: calculate_detailed_cost(f, h, s)
+        suite[f'calculate_detailed_cost[{name}]'] = lambda f=fuel_car, h=hybrid_car, s=settings: calculate_detailed_cost(f, h, s)[0].to_frame()
+        suite[f'calculate_detailed_cost_chart[{name}]'] = lambda f=fuel_car, h=hybrid_car, s=settings: \
+            calculate_detailed_cost(f, h, s)[0].to_frame(max_points=CHART_MAX_POINTS)
+
+    scenarios = pd.DataFrame([{
+        'hybrid_price': hybrid_car.price, 'fuel_car_price': fuel_car.price,
+        'hybrid_mileage': hybrid_car.mileage.value, 'fuel_car_mileage': fuel_car.mileage.value,
+        'mileage_unit': settings.mileage_unit.value, 'fuel_price': settings.fuel_price.value,
+        'fuel_unit': settings.fuel_price.per_unit.value, 'annual_distance': settings.annual_distance.value,
+        'distance_unit': settings.annual_distance.unit.value, 'pct_fuel_price_hike': settings.pct_fuel_price_hike,
+    } for fuel_car, hybrid_car, settings in cases.values()] * 33_334)
+    suite['evaluate_scenarios_100k'] = lambda: evaluate_scenarios(scenarios)
+    fuel_car, hybrid_car, settings = cases['typical']
+    rng = np.random.default_rng(0)
+    competitors = tuple(Car(type=f'car{i}', price=int(fuel_car.price * rng.uniform(0.7, 1.1)),
+                            mileage=Mileage(value=float(rng.uniform(4.5, 9.0)), unit=fuel_car.mileage.unit)) for i in range(50))
+    suite['calculate_fleet_comparison[50]'] = lambda: calculate_fleet_comparison(hybrid_car, competitors, settings)
+    # Time to first render starts with these, so heavy imports creeping back in show up as a regression
+    suite['cold_import[utils]'] = lambda: cold_import('utils')
+    suite['cold_import[main]'] = lambda: cold_import('main')
+    return suite
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ['seconds', 'peak_bytes']:
+            before, after = baseline[name][metric], result[metric]
+            if before and after / before > threshold:
+                regressions.append(f"{name} {metric}: {before:.4g} -> {after:.4g} ({after / before:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help="write results as JSON to this path")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--save-baseline', help="write results as a new baseline to this path")
+    parser.add_argument('--threshold', type=float, default=1.5, help="slowdown/memory ratio that counts as a regression")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, func in benchmarks().items():
+        if args.filter in name:
+            results[name] = measure(func)
+            print(f"{name:55s} {results[name]['seconds'] * 1e3:12.4f} ms {results[name]['peak_bytes'] / 2**20:10.2f} MiB")
+
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, 'results': results}
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
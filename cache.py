@@ -0,0 +1,349 @@
+import base64
+import hashlib
+import json
+import logging
+import numbers
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from enum import Enum
+from functools import wraps
+from typing import Dict, Optional
+
+import numpy as np
+import pydantic
+
+import helpers
+from defaults import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, PERSISTENT_CACHE_MAX_BYTES, PERSISTENT_CACHE_PATH, \
+                     PERSISTENT_CACHE_VERSION
+from lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+LOGGER = logging.getLogger(__name__)
+
+_REGISTRY: Dict[str, "LRUCache"] = {}
+# Plain classes whose instances may be persisted, by name
+_PERSISTABLE: Dict[str, type] = {}
+_disk_cache: Optional["DiskCache"] = None
+_inherited_disk_cache: Optional["DiskCache"] = None
+_disk_cache_lock = threading.Lock()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a TTL, shared by every Streamlit session in the process."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+class DiskCache:
+    """SQLite cache shared by every server process using the same file.
+
+    WAL mode lets readers run alongside a writer, each thread gets its own connection, and when the
+    stored values pass `max_bytes` the least recently used are evicted down to 90% of it. Values are
+    stored as tagged JSON (see `encode`), never pickled, so a tampered file cannot run code, and values
+    that cannot be encoded are not stored. Errors are logged and treated as misses, so a locked or
+    broken cache file never breaks a calculation.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                         "size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str):
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            value = decode(json.loads(row[0])) if row is not None else None
+        except sqlite3.Error as error:
+            LOGGER.warning("Persistent cache read failed: %s", error)
+            row = None
+        except (ValueError, TypeError, KeyError) as error:
+            LOGGER.warning("Persistent cache entry %s is unreadable: %s", key, error)
+            row = None
+        if row is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, value
+
+    def put(self, key: str, value):
+        try:
+            blob = json.dumps(encode(value), separators=(',', ':')).encode()
+        except TypeError as error:
+            LOGGER.debug("Not persisting %s: %s", key, error)
+            return
+        if len(blob) > self.max_bytes:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                             (key, blob, len(blob), time.time()))
+                self._evict(conn)
+        except sqlite3.Error as error:
+            LOGGER.warning("Persistent cache write failed: %s", error)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if total <= 0.9 * self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        try:
+            entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "path": self.path,
+        }
+
+
+def _after_fork_in_child():
+    # SQLite's lock bookkeeping does not survive fork(), so a child of a process that opened the cache
+    # must not open it again. The inherited connection is kept referenced, as closing it could also
+    # disturb the parent's locks.
+    global _disk_cache, _inherited_disk_cache
+    if _disk_cache is not None:
+        _inherited_disk_cache, _disk_cache = _disk_cache, None
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def persistent_cache() -> Optional[DiskCache]:
+    """The process's DiskCache at PERSISTENT_CACHE_PATH, or None when it is disabled or cannot be opened."""
+    global _disk_cache
+    if not PERSISTENT_CACHE_PATH or _inherited_disk_cache is not None:
+        return None
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(PERSISTENT_CACHE_PATH)), mode=0o700, exist_ok=True)
+                _disk_cache = DiskCache(PERSISTENT_CACHE_PATH, PERSISTENT_CACHE_MAX_BYTES)
+            except (OSError, sqlite3.Error) as error:
+                LOGGER.warning("Persistent cache disabled, cannot open %s: %s", PERSISTENT_CACHE_PATH, error)
+                return None
+        return _disk_cache
+
+
+def persistable(cls):
+    """Class decorator letting memoize(persist=True) store instances, rebuilt from their attributes, and
+    key calculations taking them on those attributes."""
+    _PERSISTABLE[cls.__name__] = cls
+    return cls
+
+
+def _numeric_dtype(dtype) -> np.dtype:
+    dtype = np.dtype(dtype)
+    if dtype.kind not in 'biuf':
+        raise TypeError(f"Cannot persist {dtype} values")
+    return dtype
+
+
+def encode(value):
+    """JSON-ready form of a result that `decode` rebuilds: pydantic models and enums from helpers, numeric
+    arrays, scalars and frames, tuples, lists, dicts and persistable classes. TypeError for anything else."""
+    if isinstance(value, pydantic.BaseModel):
+        return {'__model__': type(value).__name__, 'fields': value.model_dump(mode='json')}
+    if isinstance(value, Enum):
+        return {'__enum__': type(value).__name__, 'value': value.value}
+    if isinstance(value, np.ndarray):
+        _numeric_dtype(value.dtype)
+        data = np.ascontiguousarray(value)
+        return {'__ndarray__': base64.b64encode(data.tobytes()).decode(), 'dtype': data.dtype.str, 'shape': list(data.shape)}
+    if isinstance(value, np.generic):
+        return {'__scalar__': _numeric_dtype(value.dtype).str, 'value': value.item()}
+    if isinstance(value, bool) or value is None or isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, tuple):
+        return {'__tuple__': [encode(item) for item in value]}
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {'__dict__': [[encode(key), encode(item)] for key, item in value.items()]}
+    if _PERSISTABLE.get(type(value).__name__) is type(value):
+        return {'__object__': type(value).__name__, 'state': encode(vars(value))}
+    if isinstance(value, pd.DataFrame) and value.index.equals(pd.RangeIndex(len(value))):
+        return {'__frame__': [[str(name), encode(column.to_numpy())] for name, column in value.items()]}
+    raise TypeError(f"Cannot persist {type(value).__name__}")
+
+
+def decode(value):
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if '__model__' in value:
+        model = getattr(helpers, value['__model__'])
+        if not (isinstance(model, type) and issubclass(model, pydantic.BaseModel)):
+            raise TypeError(f"{value['__model__']} is not a model")
+        return model.model_validate(value['fields'])
+    if '__enum__' in value:
+        enum = getattr(helpers, value['__enum__'])
+        if not (isinstance(enum, type) and issubclass(enum, Enum)):
+            raise TypeError(f"{value['__enum__']} is not an enum")
+        return enum(value['value'])
+    if '__ndarray__' in value:
+        data = base64.b64decode(value['__ndarray__'])
+        return np.frombuffer(data, dtype=_numeric_dtype(value['dtype'])).reshape(value['shape']).copy()
+    if '__scalar__' in value:
+        return _numeric_dtype(value['__scalar__']).type(value['value'])
+    if '__tuple__' in value:
+        return tuple(decode(item) for item in value['__tuple__'])
+    if '__dict__' in value:
+        return {decode(key): decode(item) for key, item in value['__dict__']}
+    if '__object__' in value:
+        obj = object.__new__(_PERSISTABLE[value['__object__']])
+        obj.__dict__.update(decode(value['state']))
+        return obj
+    if '__frame__' in value:
+        return pd.DataFrame({name: decode(column) for name, column in value['__frame__']})
+    raise ValueError(f"Unknown persisted value {sorted(value)}")
+
+
+def _canonical(value):
+    """JSON-ready form of an argument in which equal inputs look the same, e.g. 45000 and 45000.0."""
+    if isinstance(value, pydantic.BaseModel):
+        return {'__model__': type(value).__name__, **_canonical(value.model_dump(mode='json'))}
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+        return {'__ndarray__': hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest(),
+                'dtype': value.dtype.str, 'shape': list(value.shape)}
+    if _PERSISTABLE.get(type(value).__name__) is type(value):
+        return {'__object__': type(value).__name__, **_canonical(vars(value))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    return repr(value)
+
+
+def make_key(*args, **kwargs) -> str:
+    canonical = {'args': _canonical(args), 'kwargs': _canonical(kwargs)}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def memoize(maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS, persist: bool = False):
+    """Caches a calculation on the canonical hash of its Settings/Car arguments. Results are shared and must not be mutated.
+
+    With `persist`, results also go to the persistent cache shared by all server processes.
+    """
+    def decorator(func):
+        cache = _REGISTRY[func.__qualname__] = LRUCache(maxsize, ttl)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(*args, **kwargs)
+            found, value = cache.get(key)
+            if found:
+                return value
+            disk_cache = persistent_cache() if persist else None
+            # Keys on disk outlive the code, so they also name the function and the results version
+            disk_key = f"{PERSISTENT_CACHE_VERSION}:{func.__module__}.{func.__qualname__}:{key}"
+            if disk_cache is not None:
+                found, value = disk_cache.get(disk_key)
+                if found:
+                    cache.put(key, value)
+                    return value
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            if disk_cache is not None:
+                disk_cache.put(disk_key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> Dict[str, dict]:
+    stats = {name: cache.stats() for name, cache in _REGISTRY.items()}
+    if _disk_cache is not None:
+        stats['persistent'] = _disk_cache.stats()
+    return stats
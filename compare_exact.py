@@ -0,0 +1,157 @@
+"""Compare the exact-arithmetic break-even path against the rounded one.
+
+    python compare_exact.py            # drift report, consistency checks and timings; exit 1 on failure
+
+Checks that exact results satisfy the break-even equations they solve, that both paths agree where
+rounding is a no-op, and that the exact path is no slower than the rounded path it replaces.
+"""
+import argparse
+import itertools
+import math
+import sys
+
+import numpy as np
+
+from benchmark import measure
+from exact import calculate_exact_breakeven_with_price_hike, calculate_exact_per_km_cost, exact_km, exact_kmpl, \
+                  exact_price_per_litre
+from defaults import SETTINGS_MAP
+from helpers import Car, Distance, DistanceUnit, FuelPrice, FuelUnit, Mileage, MileageUnit
+from utils import calculate_breakeven_distance, calculate_breakeven_with_price_hike, calculate_per_km_cost
+
+# Both paths are compared through their uncached implementations
+calculate_per_km_cost = calculate_per_km_cost.__wrapped__
+calculate_breakeven_distance = calculate_breakeven_distance.__wrapped__
+calculate_breakeven_with_price_hike = calculate_breakeven_with_price_hike.__wrapped__
+calculate_exact_per_km_cost = calculate_exact_per_km_cost.__wrapped__
+calculate_exact_breakeven_with_price_hike = calculate_exact_breakeven_with_price_hike.__wrapped__
+
+# Hybrid and fuel car mileages in each unit, with the fuel car always the thirstier one
+MILEAGES = {
+    MileageUnit.KMPL: [(25.0, 15.0), (22.5, 18.0), (30.0, 25.0)],
+    MileageUnit.L_100KM: [(4.0, 6.0), (3.8, 5.3), (4.4, 4.9)],
+    MileageUnit.MPG_US: [(58.0, 35.0), (50.0, 41.0), (48.0, 44.0)],
+    MileageUnit.MPG_UK: [(70.0, 42.0), (62.0, 51.0)],
+}
+FUEL_PRICES = [FuelPrice(value=1.73, per_unit=FuelUnit.L), FuelPrice(value=4.4, per_unit=FuelUnit.USGa),
+               FuelPrice(value=7.85, per_unit=FuelUnit.UKGa)]
+ANNUAL_DISTANCES = [Distance(value=15_000, unit=DistanceUnit.km), Distance(value=13_500, unit=DistanceUnit.mi)]
+PRICE_GAPS = [3_000, 5_000, 12_000]
+PCT_HIKES = [0.0, 2.5, 7.0]
+
+
+def scenarios():
+    base = SETTINGS_MAP['AUD']
+    for (unit, mileages), fuel_price, distance, gap, pct in itertools.product(
+            MILEAGES.items(), FUEL_PRICES, ANNUAL_DISTANCES, PRICE_GAPS, PCT_HIKES):
+        for hybrid_mileage, fuel_car_mileage in mileages:
+            settings = base.model_copy(update={'fuel_price': fuel_price, 'annual_distance': distance, 'mileage_unit': unit,
+                                               'sim_fuel_price_hike': True, 'pct_fuel_price_hike': pct})
+            hybrid_car = Car(type='Hybrid_Car', price=40_000 + gap, mileage=Mileage(value=hybrid_mileage, unit=unit))
+            fuel_car = Car(type='Fuel_Car', price=40_000, mileage=Mileage(value=fuel_car_mileage, unit=unit))
+            yield fuel_car, hybrid_car, settings
+
+
+def rounded_path(fuel_car: Car, hybrid_car: Car, settings):
+    hybrid_car = hybrid_car.model_copy(update={'cost_per_km': calculate_per_km_cost(hybrid_car, settings.fuel_price)})
+    fuel_car = fuel_car.model_copy(update={'cost_per_km': calculate_per_km_cost(fuel_car, settings.fuel_price)})
+    try:
+        flat_km = calculate_breakeven_distance(fuel_car, hybrid_car, settings).value
+    except ZeroDivisionError:
+        # Per-km costs that round to the same cent never break even
+        return math.inf, math.nan
+    try:
+        hike_km = calculate_breakeven_with_price_hike(fuel_car, hybrid_car, settings)[0].value
+    except ValueError:
+        hike_km = math.nan
+    return flat_km, hike_km
+
+
+def exact_path(fuel_car: Car, hybrid_car: Car, settings):
+    flat_km = (hybrid_car.price - fuel_car.price) / (calculate_exact_per_km_cost(fuel_car, settings.fuel_price)
+                                                     - calculate_exact_per_km_cost(hybrid_car, settings.fuel_price))
+    try:
+        hike_km = calculate_exact_breakeven_with_price_hike(fuel_car, hybrid_car, settings)[0].value
+    except ValueError:
+        hike_km = math.nan
+    return flat_km, hike_km
+
+
+def check_exact(fuel_car: Car, hybrid_car: Car, settings, flat_km: float, hike_km: float):
+    """Problems with the exact results, which should satisfy the equations they were solved from."""
+    problems = []
+    price_difference = hybrid_car.price - fuel_car.price
+    litres_saved_per_km = 1 / exact_kmpl(fuel_car.mileage) - 1 / exact_kmpl(hybrid_car.mileage)
+    fuel_price = exact_price_per_litre(settings.fuel_price)
+    if not math.isclose(flat_km * litres_saved_per_km * fuel_price, price_difference, rel_tol=1e-9):
+        problems.append(f"flat savings at {flat_km:.3f} km do not match the price difference")
+
+    annual_km = exact_km(settings.annual_distance)
+    year = max(1, math.ceil(hike_km / annual_km - 1e-9))
+    if math.isclose(hike_km, year * annual_km, rel_tol=1e-9):
+        # Break-even right as a year's price rise kicks in, so the savings jump past the difference
+        year += 1
+    yearly_fuel_price = fuel_price * (1 + settings.pct_fuel_price_hike / 100) ** (year - 1)
+    savings = hike_km * litres_saved_per_km * yearly_fuel_price
+    if not (math.isclose(savings, price_difference, rel_tol=1e-9) or savings > price_difference):
+        problems.append(f"hike savings at {hike_km:.3f} km are {savings:.4f}, not {price_difference}")
+    if hike_km > flat_km * (1 + 1e-9):
+        problems.append(f"hike break-even {hike_km:.3f} km is later than the flat {flat_km:.3f} km")
+    return problems
+
+
+def check_agreement():
+    """Where every input is already in base units and costs are whole cents, the paths must agree."""
+    settings = SETTINGS_MAP['INR'].model_copy(update={'fuel_price': FuelPrice(value=2.0, per_unit=FuelUnit.L),
+                                                      'sim_fuel_price_hike': True, 'pct_fuel_price_hike': 0.0})
+    hybrid_car = Car(type='Hybrid_Car', price=45_000, mileage=Mileage(value=25.0, unit=MileageUnit.KMPL))
+    fuel_car = Car(type='Fuel_Car', price=40_000, mileage=Mileage(value=20.0, unit=MileageUnit.KMPL))
+    rounded, exact = rounded_path(fuel_car, hybrid_car, settings), exact_path(fuel_car, hybrid_car, settings)
+    # The rounded path reports the first whole km past the crossing
+    if abs(rounded[0] - exact[0]) > 1e-6 or not 0 <= rounded[1] - exact[1] <= 2:
+        return [f"paths disagree without rounding: rounded {rounded}, exact {exact}"]
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--top', type=int, default=5, help="show this many of the largest drifts")
+    args = parser.parse_args(argv)
+
+    cases, problems = list(scenarios()), check_agreement()
+    drifts = []
+    for fuel_car, hybrid_car, settings in cases:
+        flat_km, hike_km = exact_path(fuel_car, hybrid_car, settings)
+        problems += check_exact(fuel_car, hybrid_car, settings, flat_km, hike_km)
+        rounded_flat_km, rounded_hike_km = rounded_path(fuel_car, hybrid_car, settings)
+        drifts.append((abs(rounded_flat_km - flat_km), abs(rounded_hike_km - hike_km), flat_km, hike_km,
+                       rounded_flat_km, rounded_hike_km, fuel_car, hybrid_car, settings))
+
+    flat_drift = np.array([drift[0] for drift in drifts])
+    hike_drift = np.array([drift[1] for drift in drifts])
+    never = ~np.isfinite(flat_drift)
+    flat_drift = flat_drift[~never]
+    print(f"{len(cases)} scenarios, {never.sum()} where rounded per-km costs are equal and never break even")
+    print(f"flat break-even drift km:  median {np.median(flat_drift):10,.1f}  max {flat_drift.max():10,.1f}")
+    print(f"hike break-even drift km:  median {np.nanmedian(hike_drift):10,.1f}  max {np.nanmax(hike_drift):10,.1f}")
+    for drift in sorted((drift for drift in drifts if np.isfinite(drift[0])), key=lambda drift: -drift[0])[:args.top]:
+        _, _, flat_km, hike_km, rounded_flat_km, rounded_hike_km, fuel_car, hybrid_car, settings = drift
+        print(f"  {hybrid_car.mileage.value} vs {fuel_car.mileage.value} {hybrid_car.mileage.unit.value}, "
+              f"{settings.fuel_price.value} / {settings.fuel_price.per_unit.value}, {settings.pct_fuel_price_hike}%: "
+              f"flat {rounded_flat_km:,.0f} -> {flat_km:,.0f} km, hike {rounded_hike_km:,.0f} -> {hike_km:,.0f} km")
+
+    fuel_car, hybrid_car, settings = cases[len(cases) // 2]
+    rounded_time = measure(lambda: rounded_path(fuel_car, hybrid_car, settings))['seconds']
+    exact_time = measure(lambda: exact_path(fuel_car, hybrid_car, settings))['seconds']
+    print(f"per scenario: rounded {rounded_time * 1e6:.1f} us, exact {exact_time * 1e6:.1f} us")
+    if exact_time > rounded_time:
+        problems.append(f"exact path is slower than the rounded path ({exact_time / rounded_time:.2f}x)")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
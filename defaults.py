@@ -1,3 +1,5 @@
+import os
+
 from helpers import Settings, Currency, MileageUnit, FuelUnit, Distance, DistanceUnit, FuelPrice
 
 AUD_SETTINGS = Settings(
@@ -65,4 +67,37 @@ SETTINGS_MAP = {
     Currency.USD.value: USD_SETTINGS,
     Currency.INR.value: INR_SETTINGS,
     Currency.GBP.value: GBP_SETTINGS,
-}
\ No newline at end of file
+}
+
+# Upper bound on points sent to the browser for each cost comparison chart
+CHART_MAX_POINTS = 500
+
+# Calculation results cache, shared by all sessions of a server process
+CACHE_MAX_ENTRIES = 256
+CACHE_TTL_SECONDS = 60 * 60
+
+# Persistent results cache, shared by every server process pointed at the same file. Off unless
+# BREAKEVEN_CACHE_PATH names a file, whose directory should only be writable by the server's user.
+# Bump the version whenever a cached calculation changes its results.
+PERSISTENT_CACHE_PATH = os.environ.get("BREAKEVEN_CACHE_PATH", "")
+PERSISTENT_CACHE_MAX_BYTES = 256 * 2**20
+PERSISTENT_CACHE_VERSION = 2
+
+# Regional fuel price history and projections (see fuel_prices.py), loaded once per server process.
+# Unset, each currency's default fuel price is used.
+FUEL_PRICE_TABLE_PATH = os.environ.get("BREAKEVEN_FUEL_PRICES", "")
+
+# Cells in the break-even sensitivity heatmap (fuel price x annual distance)
+HEATMAP_MAX_CELLS = 400
+
+# Monte Carlo fuel price simulation: fixed seed, and a sample count sized to fit the time budget
+MONTE_CARLO_SEED = 42
+MONTE_CARLO_BUDGET_SECONDS = 0.2
+MONTE_CARLO_MIN_PATHS = 256
+MONTE_CARLO_MAX_PATHS = 16_384
+
+# Types of drive the page asks a mileage and daily distances for; trip logs may use any others
+DRIVE_SEGMENTS = ['city', 'highway']
+
+# Threads costing the multi-car chart's series, each car's drawn as soon as it is ready
+FLEET_CHART_WORKERS = 4
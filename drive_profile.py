@@ -0,0 +1,264 @@
+"""Break-even over a trip log or a synthetic daily drive profile, with a mileage per type of drive.
+
+    python drive_profile.py trips.csv --hybrid-price 45000 --hybrid-mileage 4.4 --hybrid-segment-mileage city=3.8 highway=5.0 \\
+        --fuel-car-price 40000 --fuel-car-mileage 6.5 --fuel-car-segment-mileage city=7.8 highway=5.6 \\
+        --mileage-unit L/100km --fuel-price 2.0 --pct-fuel-price-hike 2.5
+
+A trip log has one row per trip, in chronological order, with `distance`, `segment` (e.g. city or
+highway) and either `day` (days since the first trip, fractions for the time of day) or `time`
+(a timestamp). Trips flow through generators one chunk at a time and only the running totals and
+one row per year are kept, so logs of millions of trips run in constant memory.
+"""
+import argparse
+import sys
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cache import memoize
+from defaults import SETTINGS_MAP
+from helpers import Car, DistanceUnit, DriveProfile, FuelPrice, FuelUnit, Mileage, MileageUnit, Settings, \
+                    convert_distance_values, list_all
+from exact import calculate_exact_per_km_cost
+from tabular_io import is_parquet, read_chunks
+from utils import calculate_per_km_cost, yearly_fuel_price_schedule
+
+DAYS_PER_YEAR = 365.25
+
+# (day, km, hybrid cost, fuel car cost) of each trip in a chunk
+CostedTrips = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def missing_trip_columns(columns) -> List[str]:
+    missing = [column for column in ['distance', 'segment'] if column not in columns]
+    if 'day' not in columns and 'time' not in columns:
+        missing.append('day or time')
+    return missing
+
+
+def read_trip_log(path, distance_unit: DistanceUnit, chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Trips of a CSV or Parquet log as (day, segment, km) chunks.
+
+    Costs look up the year each trip falls in, so days before the first trip or out of order, which a
+    stream cannot sort in bounded memory, raise ValueError.
+    """
+    origin, last_day, rows = None, 0.0, 0
+    for chunk in read_chunks(path, chunk_size):
+        if rows == 0 and missing_trip_columns(chunk):
+            raise ValueError(f"Missing trip columns: {', '.join(missing_trip_columns(chunk))}")
+        if 'day' in chunk:
+            day = chunk['day'].to_numpy(dtype=float)
+        else:
+            time = pd.to_datetime(chunk['time'])
+            if origin is None:
+                origin = time.iloc[0]
+            day = ((time - origin) / pd.Timedelta(days=1)).to_numpy(dtype=float)
+        # Also catches missing days and times, as NaN compares false
+        out_of_order = np.flatnonzero(~(np.diff(day, prepend=last_day) >= 0))
+        if len(out_of_order):
+            raise ValueError(f"Trip {rows + out_of_order[0] + 1} is before day 0 or an earlier trip; "
+                             "trips must be in chronological order")
+        last_day = day[-1] if len(day) else last_day
+        rows += len(day)
+        km = convert_distance_values(chunk['distance'].to_numpy(dtype=float), distance_unit, DistanceUnit.km)
+        yield pd.DataFrame({'day': day, 'segment': chunk['segment'].astype(str).to_numpy(), 'km': km})
+
+
+def synthetic_trips(profile: DriveProfile, chunk_days: int = 4096) -> Iterator[pd.DataFrame]:
+    """One trip per type of drive and day, following the profile's weekday and weekend distances."""
+    segments = sorted(set(profile.weekday) | set(profile.weekend))
+    to_km = convert_distance_values(1.0, profile.distance_unit, DistanceUnit.km)
+    weekday_km = np.array([profile.weekday.get(segment, 0.0) for segment in segments]) * to_km
+    weekend_km = np.array([profile.weekend.get(segment, 0.0) for segment in segments]) * to_km
+    for start in range(0, profile.num_days, chunk_days):
+        day = np.arange(start, min(start + chunk_days, profile.num_days))
+        # Day 0 is a Monday
+        km = np.where((day % 7 < 5)[:, None], weekday_km, weekend_km)
+        codes = np.broadcast_to(np.arange(len(segments)), km.shape)
+        driven = km > 0
+        yield pd.DataFrame({
+            'day': np.broadcast_to(day[:, None], km.shape)[driven].astype(float),
+            'segment': pd.Categorical.from_codes(codes[driven], segments),
+            'km': km[driven],
+        })
+
+
+class SegmentCostSchedule:
+    """Per-km cost of a car on each type of drive in each year, extended as trips reach later years.
+
+    Row `len(segments)` holds the cost at the car's own mileage, for drives without a mileage of their own.
+    """
+    def __init__(self, car: Car, segments: List[str], settings: Settings):
+        self.cars = [Car(type=car.type, price=car.price, mileage=car.segment_mileage.get(segment, car.mileage))
+                     for segment in segments] + [Car(type=car.type, price=car.price, mileage=car.mileage)]
+        self.settings = settings
+        self.table = np.empty((len(self.cars), 0))
+
+    def _extend(self, num_years: int) -> None:
+        settings = self.settings
+        pct_increase = settings.pct_fuel_price_hike if settings.sim_fuel_price_hike else 0.0
+        if settings.exact_arithmetic and settings.fuel_price_source is None:
+            fuel_price = settings.fuel_price.get_value_per(FuelUnit.L).value
+            yearly_fuel_price = fuel_price * (1 + pct_increase / 100) ** np.arange(num_years)
+        else:
+            yearly_fuel_price = yearly_fuel_price_schedule(settings, num_years, pct_increase)
+        per_km_cost = calculate_exact_per_km_cost if settings.exact_arithmetic else calculate_per_km_cost
+        new_years = [[per_km_cost(car, FuelPrice(value=float(price), per_unit=FuelUnit.L))
+                      for price in yearly_fuel_price[self.table.shape[1]:]] for car in self.cars]
+        self.table = np.concatenate([self.table, np.array(new_years).reshape(len(self.cars), -1)], axis=1)
+
+    def costs(self, codes: np.ndarray, years: np.ndarray) -> np.ndarray:
+        if len(years) and years.max() >= self.table.shape[1]:
+            self._extend(max(2 * self.table.shape[1], int(years.max()) + 1))
+        return self.table[codes, years]
+
+
+def cost_trips(trips: Iterable[pd.DataFrame], fuel_car: Car, hybrid_car: Car, settings: Settings) -> Iterator[CostedTrips]:
+    """Costs each chunk of trips for both cars at the fuel price of the year it is driven in."""
+    segments = sorted(set(hybrid_car.segment_mileage) | set(fuel_car.segment_mileage))
+    hybrid_schedule = SegmentCostSchedule(hybrid_car, segments, settings)
+    fuel_car_schedule = SegmentCostSchedule(fuel_car, segments, settings)
+    segment_index = pd.Index(segments)
+    for chunk in trips:
+        codes = segment_index.get_indexer(chunk['segment'])
+        codes[codes < 0] = len(segments)
+        day, km = chunk['day'].to_numpy(dtype=float), chunk['km'].to_numpy(dtype=float)
+        years = (day // DAYS_PER_YEAR).astype(np.intp)
+        yield day, km, km * hybrid_schedule.costs(codes, years), km * fuel_car_schedule.costs(codes, years)
+
+
+def _add_by_year(totals: np.ndarray, years: np.ndarray, values: np.ndarray) -> np.ndarray:
+    by_year = np.bincount(years, weights=values)
+    if len(by_year) > len(totals):
+        totals = np.pad(totals, (0, len(by_year) - len(totals)))
+    totals[:len(by_year)] += by_year
+    return totals
+
+
+def accumulate_costs(costed: Iterable[CostedTrips], price_difference: float) -> Dict:
+    """Running totals over the costed trips and the trip where fuel savings first reach the price difference."""
+    trips, total_km, hybrid_cost, fuel_car_cost, last_day = 0, 0.0, 0.0, 0.0, 0.0
+    breakeven_km, breakeven_day = (0.0, 0.0) if price_difference <= 0 else (np.nan, np.nan)
+    yearly_km, yearly_hybrid, yearly_fuel_car = np.zeros(0), np.zeros(0), np.zeros(0)
+    for day, km, hybrid, fuel_car in costed:
+        if not len(day):
+            continue
+        if np.isnan(breakeven_km):
+            savings = fuel_car_cost - hybrid_cost + np.cumsum(fuel_car - hybrid)
+            crossed = np.flatnonzero(savings >= price_difference)
+            if len(crossed):
+                i = crossed[0]
+                trip_savings = fuel_car[i] - hybrid[i]
+                # Savings grow evenly over the trip, so the crossing is part way through it
+                fraction = 1 - (savings[i] - price_difference) / trip_savings if trip_savings > 0 else 1.0
+                breakeven_km = total_km + km[:i].sum() + fraction * km[i]
+                breakeven_day = float(day[i])
+        years = (day // DAYS_PER_YEAR).astype(np.intp)
+        yearly_km = _add_by_year(yearly_km, years, km)
+        yearly_hybrid = _add_by_year(yearly_hybrid, years, hybrid)
+        yearly_fuel_car = _add_by_year(yearly_fuel_car, years, fuel_car)
+        trips += len(day)
+        total_km += km.sum()
+        hybrid_cost += hybrid.sum()
+        fuel_car_cost += fuel_car.sum()
+        last_day = max(last_day, float(day.max()))
+    yearly = pd.DataFrame({'year': np.arange(1, len(yearly_km) + 1), 'km': yearly_km,
+                           'hybrid_fuel_cost': yearly_hybrid, 'fuel_car_fuel_cost': yearly_fuel_car})
+    return {
+        'trips': trips,
+        'days': last_day,
+        'total_km': float(total_km),
+        'hybrid_fuel_cost': float(hybrid_cost),
+        'fuel_car_fuel_cost': float(fuel_car_cost),
+        'breakeven_km': float(breakeven_km),
+        'breakeven_years': float(breakeven_day) / DAYS_PER_YEAR,
+        'yearly': yearly,
+    }
+
+
+def simulate_drive_profile(trips: Iterable[pd.DataFrame], fuel_car: Car, hybrid_car: Car, settings: Settings) -> Dict:
+    """Fuel costs of both cars over the trips and the break-even, NaN if the trips never reach it.
+
+    'yearly' holds the km and fuel cost of each year, and its 'Hybrid Cost' and 'Non-Hybrid Cost' the
+    cumulative cost with the car's price, as in the cost chart.
+    """
+    result = accumulate_costs(cost_trips(trips, fuel_car, hybrid_car, settings), hybrid_car.price - fuel_car.price)
+    yearly = result['yearly']
+    yearly['Hybrid Cost'] = hybrid_car.price + yearly['hybrid_fuel_cost'].cumsum()
+    yearly['Non-Hybrid Cost'] = fuel_car.price + yearly['fuel_car_fuel_cost'].cumsum()
+    return result
+
+
+@memoize()
+def calculate_drive_profile(fuel_car: Car, hybrid_car: Car, settings: Settings, profile: DriveProfile) -> Dict:
+    return simulate_drive_profile(synthetic_trips(profile), fuel_car, hybrid_car, settings)
+
+
+def parse_segment_mileage(specs: List[str], unit: MileageUnit) -> Dict[str, Mileage]:
+    """Parses `segment=value` pairs, e.g. city=3.8 highway=5.0."""
+    segment_mileage = {}
+    for spec in specs:
+        segment, _, value = spec.partition('=')
+        segment_mileage[segment] = Mileage(value=float(value), unit=unit)
+    return segment_mileage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('input', help="CSV or Parquet (.parquet/.pq) trip log")
+    parser.add_argument('--currency', choices=list(SETTINGS_MAP), default='AUD', help="defaults for the options below")
+    for car in ['hybrid', 'fuel-car']:
+        parser.add_argument(f'--{car}-price', type=float, required=True)
+        parser.add_argument(f'--{car}-mileage', type=float, required=True, help="for drives without a mileage of their own")
+        parser.add_argument(f'--{car}-segment-mileage', nargs='*', default=[], metavar='SEGMENT=MILEAGE')
+    parser.add_argument('--mileage-unit', choices=list_all(MileageUnit))
+    parser.add_argument('--fuel-price', type=float)
+    parser.add_argument('--fuel-unit', choices=list_all(FuelUnit))
+    parser.add_argument('--pct-fuel-price-hike', type=float, default=0.0)
+    parser.add_argument('--distance-unit', choices=list_all(DistanceUnit), help="of the log's distances")
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    if is_parquet(args.input):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("Parquet files need pyarrow: pip install pyarrow")
+    missing = missing_trip_columns(next(read_chunks(args.input, 1), pd.DataFrame()))
+    if missing:
+        parser.error(f"{args.input} is missing columns: {', '.join(missing)}")
+
+    defaults = SETTINGS_MAP[args.currency]
+    mileage_unit = MileageUnit(args.mileage_unit) if args.mileage_unit else defaults.mileage_unit
+    fuel_unit = FuelUnit(args.fuel_unit) if args.fuel_unit else defaults.fuel_unit
+    distance_unit = DistanceUnit(args.distance_unit) if args.distance_unit else defaults.distance_unit
+    settings = defaults.model_copy(update={
+        'fuel_price': FuelPrice(value=args.fuel_price if args.fuel_price is not None else defaults.fuel_price.get_value_per(fuel_unit).value,
+                                per_unit=fuel_unit),
+        'sim_fuel_price_hike': args.pct_fuel_price_hike != 0, 'pct_fuel_price_hike': args.pct_fuel_price_hike,
+    })
+    hybrid_car, fuel_car = (
+        Car(type=car_type, price=round(price), mileage=Mileage(value=mileage, unit=mileage_unit),
+            segment_mileage=parse_segment_mileage(segment_mileage, mileage_unit))
+        for car_type, price, mileage, segment_mileage in [
+            ('Hybrid_Car', args.hybrid_price, args.hybrid_mileage, args.hybrid_segment_mileage),
+            ('Fuel_Car', args.fuel_car_price, args.fuel_car_mileage, args.fuel_car_segment_mileage)])
+
+    try:
+        result = simulate_drive_profile(read_trip_log(args.input, distance_unit, args.chunk_size), fuel_car, hybrid_car, settings)
+    except ValueError as error:
+        parser.error(f"{args.input}: {error}")
+    to_unit = convert_distance_values(1.0, DistanceUnit.km, distance_unit)
+    print(f"{result['trips']:,} trips over {result['days']:,.1f} days, {result['total_km'] * to_unit:,.0f} {distance_unit.value}")
+    print(f"fuel cost: hybrid {result['hybrid_fuel_cost']:,.2f}, fuel car {result['fuel_car_fuel_cost']:,.2f} {settings.currency.value}")
+    if np.isnan(result['breakeven_km']):
+        print("break-even: not reached")
+    else:
+        print(f"break-even: {result['breakeven_km'] * to_unit:,.0f} {distance_unit.value}, "
+              f"{result['breakeven_years']:.1f} years")
+    result['yearly'].to_csv(sys.stdout, index=False, float_format='%.2f')
+
+
+if __name__ == "__main__":
+    main()
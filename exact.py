@@ -0,0 +1,92 @@
+"""Full-precision break-even path: conversions and costs stay unrounded plain floats, so rounding only
+happens when values are displayed. The rounded path in utils.py remains the default."""
+import math
+
+import numpy as np
+
+from cache import memoize
+from fuel_prices import fuel_price_table
+from helpers import Car, Distance, DistanceUnit, FuelPrice, FuelUnit, Mileage, MileageUnit, Settings, \
+                    convert_distance_values, convert_fuel_price_values, convert_mileage_values
+
+# Like the rounded path, the page reports break-evens however far away they are, within reason
+MAX_YEARS = 10_000
+
+
+def exact_kmpl(mileage: Mileage) -> float:
+    if mileage.unit == MileageUnit.L_100KM and mileage.value == 0:
+        raise ValueError(f"Value cannot be zero for this conversion")
+    return float(convert_mileage_values(mileage.value, mileage.unit, MileageUnit.KMPL))
+
+
+def exact_price_per_litre(fuel_price: FuelPrice) -> float:
+    return float(convert_fuel_price_values(fuel_price.value, fuel_price.per_unit, FuelUnit.L))
+
+
+def exact_km(distance: Distance) -> float:
+    return float(convert_distance_values(distance.value, distance.unit, DistanceUnit.km))
+
+
+def solve_exact_breakeven_km(price_difference, hybrid_kmpl, fuel_car_kmpl, fuel_price, pct_increase, annual_km,
+                             max_years: int = 100, yearly_fuel_price: np.ndarray = None):
+    """Returns the exact (km, year, fuel price) where fuel savings reach the price difference, NaN if never.
+
+    As in solve_breakeven_km, the whole distance is costed at the current year's price, so within a year
+    the savings are linear in km and each year's crossing is a division. Yearly prices compound unrounded.
+    Inputs may be scalars or (n,) arrays. A `yearly_fuel_price` schedule replaces the compounding one.
+    """
+    price_difference, hybrid_kmpl, fuel_car_kmpl, fuel_price, pct_increase, annual_km = (
+        np.asarray(value, dtype=float)[..., None] for value in
+        (price_difference, hybrid_kmpl, fuel_car_kmpl, fuel_price, pct_increase, annual_km))
+    litres_saved_per_km = 1 / fuel_car_kmpl - 1 / hybrid_kmpl
+    with np.errstate(divide='ignore', invalid='ignore'):
+        flat_years = price_difference / (fuel_price * litres_saved_per_km) / annual_km
+    flat_years = flat_years[np.isfinite(flat_years)]
+    # Prices that never fall reach break-even no later than the flat price does
+    num_years = max_years
+    if np.all(pct_increase >= 0):
+        num_years = int(min(max_years, math.ceil(flat_years.max(initial=0)) + 1))
+
+    if yearly_fuel_price is None:
+        yearly_fuel_price = fuel_price * (1 + pct_increase / 100) ** np.arange(num_years)
+    year = np.arange(1, yearly_fuel_price.shape[-1] + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        threshold = price_difference / (yearly_fuel_price * litres_saved_per_km)
+    crossed = (threshold > 0) & (threshold <= year * annual_km)
+    idx = np.expand_dims(np.argmax(crossed, axis=-1), -1)
+    found = np.take_along_axis(crossed, idx, -1).squeeze(-1)
+    # A price rise at the start of a year can carry savings past the difference before any km of that year
+    km = np.maximum(np.take_along_axis(threshold, idx, -1), idx * annual_km).squeeze(-1)
+    price = np.take_along_axis(np.broadcast_to(yearly_fuel_price, crossed.shape), idx, -1).squeeze(-1)
+    return (np.where(found, km, np.nan), np.where(found, idx.squeeze(-1) + 1, 0), np.where(found, price, np.nan))
+
+
+@memoize()
+def calculate_exact_per_km_cost(car: Car, fuel_price: FuelPrice) -> float:
+    return exact_price_per_litre(fuel_price) / exact_kmpl(car.mileage)
+
+
+@memoize()
+def calculate_exact_breakeven_with_price_hike(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    """Drop-in for utils.calculate_breakeven_with_price_hike, with a fractional km and unrounded years and price."""
+    annual_km = exact_km(settings.annual_distance)
+    price_difference = hybrid_car.price - fuel_car.price
+    hybrid_kmpl, fuel_car_kmpl = exact_kmpl(hybrid_car.mileage), exact_kmpl(fuel_car.mileage)
+    yearly_fuel_price = None
+    source = settings.fuel_price_source
+    if source is not None:
+        table = fuel_price_table()
+        # Past the first year, a region's prices can dip below it
+        lowest_price = table.lowest_price(source.region, source.start_year)
+        litres_saved_per_km = 1 / fuel_car_kmpl - 1 / hybrid_kmpl
+        num_years = MAX_YEARS
+        if price_difference > 0 and litres_saved_per_km > 0:
+            num_years = min(MAX_YEARS, math.ceil(price_difference / (lowest_price * litres_saved_per_km) / annual_km) + 1)
+        yearly_fuel_price = table.yearly_prices(source.region, source.start_year, num_years, settings.pct_fuel_price_hike)
+    km, year, fuel_price = solve_exact_breakeven_km(price_difference, hybrid_kmpl, fuel_car_kmpl,
+                                                    exact_price_per_litre(settings.fuel_price),
+                                                    settings.pct_fuel_price_hike, annual_km, MAX_YEARS, yearly_fuel_price)
+    if year == 0:
+        raise ValueError(f"Break-even is not reached within {MAX_YEARS} years")
+    return (Distance(value=float(km), unit=DistanceUnit.km), float(km) / annual_km,
+            FuelPrice(value=float(fuel_price), per_unit=FuelUnit.L))
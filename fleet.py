@@ -0,0 +1,132 @@
+"""Compare one hybrid against a set of competitor cars.
+
+Per-km costs are one array over the cars and break-evens one (cars x cars) matrix, in which row i against
+column j is where car i, the dearer and more frugal of the two, has saved its price gap over car j.
+"""
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cache import memoize
+from helpers import Car, DistanceUnit, FuelUnit, Mileage, MileageUnit, Settings
+from utils import downsample_km, solve_breakeven_km, yearly_fuel_price_schedule
+
+# Hike break-evens further out than this are reported as never
+MAX_YEARS = 100
+
+
+def read_cars(file, mileage_unit: MileageUnit) -> List[Car]:
+    """Cars from a CSV with `name`, `price` and `mileage` columns, and an optional `mileage_unit` per row."""
+    df = pd.read_csv(file)
+    missing = [column for column in ['name', 'price', 'mileage'] if column not in df]
+    if missing:
+        raise ValueError(f"Missing car columns: {', '.join(missing)}")
+    return cars_from_frame(df, mileage_unit)
+
+
+def cars_from_frame(df: pd.DataFrame, mileage_unit: MileageUnit) -> List[Car]:
+    # Blank or incomplete rows, as a table being edited has, are skipped
+    df = df.dropna(subset=['name', 'price', 'mileage'])
+    units = df['mileage_unit'].fillna(mileage_unit.value) if 'mileage_unit' in df else [mileage_unit.value] * len(df)
+    return [Car(type=str(name), price=round(float(price)), mileage=Mileage(value=float(mileage), unit=MileageUnit(unit)))
+            for name, price, mileage, unit in zip(df['name'], df['price'], df['mileage'], units) if mileage > 0]
+
+
+def pairwise_breakevens(prices: np.ndarray, cost_per_km: np.ndarray, kmpl: np.ndarray, yearly_fuel_price: np.ndarray,
+                        annual_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(cars x cars) break-even km and years of row over column car, at today's price when `yearly_fuel_price`
+    is None and over the yearly prices otherwise. 0 where the row car is no dearer and no thirstier, NaN where
+    it never breaks even."""
+    prices, cost_per_km, kmpl = (np.asarray(value, dtype=float) for value in (prices, cost_per_km, kmpl))
+    price_gap = prices[:, None] - prices[None, :]
+    saving_per_km = cost_per_km[None, :] - cost_per_km[:, None]
+    valid = (price_gap > 0) & (saving_per_km > 0)
+    already_ahead = (price_gap <= 0) & (saving_per_km >= 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        km = np.where(valid, price_gap / saving_per_km, np.nan)
+    years = km / annual_km
+
+    if yearly_fuel_price is not None:
+        rows, cols = np.nonzero(valid & (kmpl[:, None] > kmpl[None, :]))
+        km, years = np.full(price_gap.shape, np.nan), np.full(price_gap.shape, np.nan)
+        if len(rows):
+            hike_km, hike_year = solve_breakeven_km(price_gap[rows, cols, None], kmpl[rows, None], kmpl[cols, None],
+                                                    yearly_fuel_price[None, :], annual_km)
+            found = hike_year > 0
+            km[rows[found], cols[found]] = hike_km[found]
+            years[rows[found], cols[found]] = np.round(hike_year[found] - 1 + (hike_km[found] % annual_km) / annual_km, 1)
+    km[already_ahead], years[already_ahead] = 0.0, 0.0
+    np.fill_diagonal(km, np.nan)
+    np.fill_diagonal(years, np.nan)
+    return km, years
+
+
+@memoize()
+def calculate_fleet_comparison(hybrid_car: Car, competitors: Tuple[Car, ...], settings: Settings) -> Dict:
+    """Per-km costs and break-evens of the hybrid and competitors, the hybrid's first.
+
+    'ranking' has a row per competitor, soonest break-even of the hybrid over it first; 'breakeven_km' and
+    'breakeven_years' are the full pairwise matrices.
+    """
+    cars = [hybrid_car, *competitors]
+    names = [car.type for car in cars]
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    price_per_litre = settings.fuel_price.get_value_per(FuelUnit.L).value
+    prices = np.array([car.price for car in cars], dtype=float)
+    kmpl = np.array([car.standardized_mileage.value for car in cars])
+    cost_per_km = price_per_litre / kmpl
+    if not settings.exact_arithmetic:
+        # As calculate_per_km_cost rounds them
+        cost_per_km = np.round(cost_per_km, 2)
+
+    breakeven_km, breakeven_years = pairwise_breakevens(prices, cost_per_km, kmpl, None, annual_km)
+    if settings.sim_fuel_price_hike:
+        # Every pair, not only the hybrid's, must reach its break-even within the schedule. Prices only rise
+        # past the first year without a region; with one, leave room for dips
+        flat_km = breakeven_km[np.isfinite(breakeven_km)]
+        num_years = MAX_YEARS if settings.fuel_price_source is not None else \
+                    min(MAX_YEARS, math.ceil((flat_km.max(initial=0) + 2) / annual_km) + 1)
+        breakeven_km, breakeven_years = pairwise_breakevens(prices, cost_per_km, kmpl,
+                                                            yearly_fuel_price_schedule(settings, num_years), annual_km)
+
+    ranking = pd.DataFrame({
+        'car': names[1:],
+        'price': prices[1:],
+        'cost_per_km': cost_per_km[1:],
+        'price_gap': prices[0] - prices[1:],
+        'annual_savings': (cost_per_km[1:] - cost_per_km[0]) * annual_km,
+        'breakeven_km': breakeven_km[0, 1:],
+        'breakeven_years': breakeven_years[0, 1:],
+    }).sort_values(['breakeven_years', 'annual_savings'], ascending=[True, False], na_position='last', kind='stable')
+    return {
+        'cost_per_km': pd.Series(cost_per_km, index=names),
+        'ranking': ranking.reset_index(drop=True),
+        'breakeven_km': pd.DataFrame(breakeven_km, index=names, columns=names),
+        'breakeven_years': pd.DataFrame(breakeven_years, index=names, columns=names),
+    }
+
+
+def fleet_horizon_km(comparison: Dict, settings: Settings) -> int:
+    """Distance the overlaid chart runs to: past the hybrid's latest break-even, between 1 and 30 years of driving."""
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    breakeven_km = comparison['ranking']['breakeven_km'].to_numpy()
+    latest = np.nanmax(breakeven_km) if np.isfinite(breakeven_km).any() else 10 * annual_km
+    return int(np.clip(1.25 * latest, annual_km, 30 * annual_km)) + 1
+
+
+@memoize()
+def calculate_car_cost_series(car: Car, settings: Settings, max_km: int, max_points: int) -> pd.DataFrame:
+    """Price plus fuel cost of one car over [1, max_km), on the points the cost chart downsamples to."""
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    km = downsample_km(max_km, annual_km, max_points)
+    yearly_fuel_price = yearly_fuel_price_schedule(settings, math.ceil(max_km / annual_km),
+                                                   settings.pct_fuel_price_hike if settings.sim_fuel_price_hike else 0.0)
+    # As in the cost chart, the whole distance is costed at the price of the year it reaches
+    fuel_price = yearly_fuel_price[np.minimum(np.ceil(km / annual_km).astype(np.int64), len(yearly_fuel_price)) - 1]
+    return pd.DataFrame({
+        'km': km.astype(np.int32 if max_km <= np.iinfo(np.int32).max else np.int64),
+        'car': car.type,
+        'cost': (car.price + km / car.standardized_mileage.value * fuel_price).astype(np.float32),
+    })
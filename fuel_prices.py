@@ -0,0 +1,130 @@
+"""Regional fuel price history and projections, loaded once per process and indexed by region and month.
+
+The table is a CSV or Parquet file named by BREAKEVEN_FUEL_PRICES, one row per region and date:
+
+    region,currency,date,price,fuel_unit
+    New South Wales,AUD,2023-01,1.89,Liter
+
+Dates are months (2023-01) or days, whose prices are averaged over the month. Dates after today are
+projections. `fuel_unit` is optional and defaults to litres. Each region has one currency. Without a
+file, there are no regions and the page uses its fuel price input.
+"""
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from defaults import FUEL_PRICE_TABLE_PATH
+from helpers import FuelUnit, convert_fuel_price_values
+from lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+LOGGER = logging.getLogger(__name__)
+
+_table = None
+_table_loaded = False
+_table_lock = threading.Lock()
+
+
+def _month(year: int, month: int = 1) -> int:
+    return year * 12 + month - 1
+
+
+class RegionPrices:
+    """Per-litre price of each month from `first_month` on, gaps carried forward, with running sums so
+    that the average over any run of months is two lookups."""
+    def __init__(self, currency: str, first_month: int, prices: np.ndarray):
+        self.currency = currency
+        self.first_month = first_month
+        self.prices = prices
+        self.cumulative = np.concatenate([[0.0], np.cumsum(prices)])
+
+    @property
+    def years(self) -> Tuple[int, int]:
+        return (self.first_month // 12, (self.first_month + len(self.prices) - 1) // 12)
+
+
+class FuelPriceTable:
+    def __init__(self, regions: Dict[str, RegionPrices], fingerprint: str, path: Optional[str] = None):
+        self.index = regions
+        self.fingerprint = fingerprint
+        self.path = path
+
+    def regions(self, currency: str) -> List[str]:
+        return sorted(region for region, prices in self.index.items() if prices.currency == currency)
+
+    def years(self, region: str) -> Tuple[int, int]:
+        return self.index[region].years
+
+    def price(self, region: str, year: int, month: int = 1) -> float:
+        """Per-litre price in a month, the latest one for months past the end of the table."""
+        prices = self.index[region]
+        offset = _month(year, month) - prices.first_month
+        if offset < 0:
+            raise KeyError(f"No {region} fuel price before {prices.years[0]}")
+        return float(prices.prices[min(offset, len(prices.prices) - 1)])
+
+    def lowest_price(self, region: str, start_year: int) -> float:
+        prices = self.index[region]
+        return float(prices.prices[max(0, _month(start_year) - prices.first_month):].min())
+
+    def yearly_prices(self, region: str, start_year: int, num_years: int, pct_increase: float) -> np.ndarray:
+        """Average per-litre price of each year from `start_year`. Years past the end of the table carry
+        on from its last year at `pct_increase` % a year."""
+        prices = self.index[region]
+        if not prices.years[0] <= start_year <= prices.years[1]:
+            raise KeyError(f"{region} fuel prices are for {prices.years[0]} to {prices.years[1]}")
+        start = _month(start_year) - prices.first_month + 12 * np.arange(num_years)
+        low = np.clip(start, 0, len(prices.prices))
+        high = np.clip(start + 12, 0, len(prices.prices))
+        covered = high > low
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yearly = (prices.cumulative[high] - prices.cumulative[low]) / (high - low)
+        last = int(np.flatnonzero(covered)[-1])
+        beyond = np.arange(num_years) - last
+        return np.where(covered, yearly, yearly[last] * (1 + pct_increase / 100) ** beyond)
+
+
+def load_fuel_price_table(path: str) -> FuelPriceTable:
+    with open(path, 'rb') as file:
+        fingerprint = hashlib.sha256(file.read()).hexdigest()[:16]
+    if path.lower().endswith(('.parquet', '.pq')):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, dtype={'region': str, 'currency': str, 'date': str})
+    if 'fuel_unit' not in df:
+        df['fuel_unit'] = FuelUnit.L.value
+    dates = pd.to_datetime(df['date'].astype(str), format='mixed')
+    df['month'] = dates.dt.year * 12 + dates.dt.month - 1
+    df['price'] = df['price'].astype(float)
+    for unit in df['fuel_unit'].unique():
+        rows = df['fuel_unit'] == unit
+        df.loc[rows, 'price'] = convert_fuel_price_values(df.loc[rows, 'price'], FuelUnit(unit), FuelUnit.L)
+
+    # Prices are looked up by region alone, so one listed under two currencies would be ambiguous
+    currencies = df.groupby('region')['currency'].nunique()
+    if (currencies > 1).any():
+        raise ValueError(f"Regions with prices in more than one currency: {', '.join(currencies.index[currencies > 1])}")
+    regions = {}
+    for (region, currency), group in df.groupby(['region', 'currency']):
+        monthly = group.groupby('month')['price'].mean()
+        months = np.arange(monthly.index.min(), monthly.index.max() + 1)
+        regions[region] = RegionPrices(currency, int(months[0]), monthly.reindex(months).ffill().to_numpy())
+    return FuelPriceTable(regions, fingerprint, path)
+
+
+def fuel_price_table() -> Optional[FuelPriceTable]:
+    """The process's table from FUEL_PRICE_TABLE_PATH, loaded on first use and shared by every session,
+    or None without one."""
+    global _table, _table_loaded
+    with _table_lock:
+        if not _table_loaded and FUEL_PRICE_TABLE_PATH:
+            try:
+                _table = load_fuel_price_table(FUEL_PRICE_TABLE_PATH)
+            except (OSError, ValueError, KeyError) as error:
+                LOGGER.warning("No fuel price regions, cannot load %s: %s", FUEL_PRICE_TABLE_PATH, error)
+        _table_loaded = True
+        return _table
@@ -0,0 +1,77 @@
+from typing import Callable, Dict
+
+
+class Node:
+    """A derived value computed by `func` from the values of `deps`.
+
+    `key` picks what part of the value matters downstream: when a recomputed value has the same key
+    as the previous one, dependents are left alone even though the node itself ran.
+    """
+
+    def __init__(self, func: Callable, *deps: str, key: Callable = None):
+        self.func = func
+        self.deps = deps
+        self.key = key
+
+
+def view(source: str, key: Callable) -> Node:
+    """Passes `source` through unchanged, but only signals a change when `key(source)` changes."""
+    return Node(lambda value: value, source, key=key)
+
+
+def _same(old, new) -> bool:
+    if hasattr(old, 'equals'):
+        return type(old) is type(new) and old.equals(new)
+    try:
+        return bool(old == new)
+    except ValueError:
+        return False
+
+
+class ComputationGraph:
+    """Pull-based incremental computation: `get` only reruns nodes whose inputs changed since last time.
+
+    All values and versions live in `state`, e.g. a dict kept in `st.session_state`, so each session
+    recomputes only what its own reruns changed.
+    """
+
+    def __init__(self, nodes: Dict[str, Node], state: dict):
+        self.nodes = nodes
+        self.values = state.setdefault('values', {})
+        self.versions = state.setdefault('versions', {})
+        self.keys = state.setdefault('keys', {})
+        self.dep_versions = state.setdefault('dep_versions', {})
+        # Nodes recomputed since the graph was bound to the state, for profiling
+        self.recomputed = []
+
+    def set_input(self, name: str, value) -> None:
+        if name in self.nodes:
+            raise ValueError(f"{name} is a derived node, not an input")
+        if name not in self.values or not _same(self.values[name], value):
+            self._store(name, value, value)
+
+    def get(self, name: str):
+        self._refresh(name)
+        return self.values[name]
+
+    def _refresh(self, name: str) -> int:
+        node = self.nodes.get(name)
+        if node is None:
+            if name not in self.versions:
+                raise KeyError(f"Input {name} has not been set")
+            return self.versions[name]
+
+        dep_versions = tuple(self._refresh(dep) for dep in node.deps)
+        if self.dep_versions.get(name) != dep_versions:
+            value = node.func(*(self.values[dep] for dep in node.deps))
+            key = node.key(value) if node.key else value
+            if name not in self.keys or not _same(self.keys[name], key):
+                self._store(name, value, key)
+            self.dep_versions[name] = dep_versions
+            self.recomputed.append(name)
+        return self.versions[name]
+
+    def _store(self, name: str, value, key) -> None:
+        self.values[name] = value
+        self.keys[name] = key
+        self.versions[name] = self.versions.get(name, 0) + 1
@@ -1,6 +1,10 @@
 from enum import Enum
+from functools import cached_property
+from typing import Dict, Optional
 import pydantic
 
+from profiling import count_models
+
 
 class Currency(Enum):
     AUD = "AUD"
@@ -20,7 +24,12 @@ class FuelUnit(Enum):
     UKGa = "UK Gal"
 
 
-class FuelQuantity(pydantic.BaseModel):
+@count_models
+class Model(pydantic.BaseModel):
+    pass
+
+
+class FuelQuantity(Model):
     value: float
     unit: FuelUnit
 
@@ -28,7 +37,7 @@ class FuelQuantity(pydantic.BaseModel):
         return convert_fuel_quantity(self, target_unit)
 
 
-class FuelPrice(pydantic.BaseModel):
+class FuelPrice(Model):
     value: float
     per_unit: FuelUnit
 
@@ -43,22 +52,17 @@ class MileageUnit(Enum):
     MPG_UK = "MPG-UK"
 
 
-class Distance(pydantic.BaseModel):
+class Distance(Model):
     value: float
     unit: DistanceUnit
 
     def get_value_in(self, target_unit: DistanceUnit):
         if self.unit == target_unit:
             return Distance(value=self.value, unit=target_unit)
-        elif self.unit == DistanceUnit.km and target_unit == DistanceUnit.mi:
-            return Distance(value=round(self.value / 1.60934, 2), unit=target_unit)
-        elif self.unit == DistanceUnit.mi and target_unit == DistanceUnit.km:
-            return Distance(value=round(self.value * 1.60934, 2), unit=target_unit)
-        else:
-            raise ValueError(f"Unsupported DistanceUnit: {DistanceUnit}")
+        return Distance(value=round(convert_distance_values(self.value, self.unit, target_unit), 2), unit=target_unit)
 
 
-class Mileage(pydantic.BaseModel):
+class Mileage(Model):
     value: float
     unit: MileageUnit
 
@@ -66,26 +70,50 @@ class Mileage(pydantic.BaseModel):
         return convert_mileage(self, target_unit)
     
 
-class Car(pydantic.BaseModel):
+class OwnershipCosts(Model):
+    financed_pct: float = 0.0
+    loan_rate_pct: float = 0.0
+    loan_years: int = 0
+    insurance_per_year: float = 0.0
+    servicing_per_year: float = 0.0
+    battery_replacement_cost: float = 0.0
+    # Ownership year the battery is replaced in, 0 for never
+    battery_replacement_year: int = 0
+    # Yearly loss of resale value; None leaves resale out, as the break-even on purchase and fuel does
+    depreciation_pct: Optional[float] = None
+
+
+class Car(Model):
     type: str
     price: int
     mileage: Mileage
     cost_per_km: float = None
+    ownership: OwnershipCosts = pydantic.Field(default_factory=OwnershipCosts)
+    # Mileage on each type of drive, e.g. 'city' or 'highway'; other drives use `mileage`
+    segment_mileage: Dict[str, Mileage] = pydantic.Field(default_factory=dict)
     
-    @property
+    @cached_property
     def standardized_mileage(self) -> Mileage:
         return self.mileage.get_value_in(MileageUnit.KMPL)
 
-    @property
-    def cost_per_km(self):
-        return self.cost_per_km
-    
-    @cost_per_km.setter
-    def name(self, cost_per_km: float):
-        self.cost_per_km = cost_per_km
+
+class DriveProfile(Model):
+    # Distance driven on each type of drive on a weekday and on a weekend day, in `distance_unit`
+    weekday: Dict[str, float]
+    weekend: Dict[str, float]
+    distance_unit: DistanceUnit
+    num_days: int
+
+
+class FuelPriceSource(Model):
+    # Region of the fuel price table whose yearly prices, from `start_year` on, replace the yearly hike
+    region: str
+    start_year: int
+    # Fingerprint of the table, so results cached for another table are not reused
+    table: str
 
 
-class Settings(pydantic.BaseModel):
+class Settings(Model):
     currency: Currency
     fuel_price: FuelPrice
     sim_fuel_price_hike: bool
@@ -97,17 +125,82 @@ class Settings(pydantic.BaseModel):
     def_fuel_car_price: float
     car_price_step: int
     distance_unit: DistanceUnit
+    # Skip the 2 d.p. rounding of conversions and per-km costs, rounding only for display
+    exact_arithmetic: bool = False
+    ownership_years: int = 10
+    discount_rate_pct: float = 0.0
+    fuel_price_source: Optional[FuelPriceSource] = None
+
+
+# Units of each kind expressed in a base unit (litre, km, km/L). Values convert with
+# `value * TABLE[from_unit] / TABLE[to_unit]`, which works on floats and NumPy arrays alike.
+LITRES_PER_FUEL_UNIT = {
+    FuelUnit.L: 1.0,
+    FuelUnit.USGa: 3.785,
+    FuelUnit.UKGa: 4.546,
+}
+
+KM_PER_DISTANCE_UNIT = {
+    DistanceUnit.km: 1.0,
+    DistanceUnit.mi: 1.60934,
+}
+
+# L/100km is a reciprocal unit and is handled separately as `100 / value`
+KMPL_PER_MILEAGE_UNIT = {
+    MileageUnit.KMPL: 1.0,
+    MileageUnit.MPG_US: 0.425144,
+    MileageUnit.MPG_UK: 0.354006,
+}
+
+MILEAGE_UNIT_PER_KMPL = {
+    MileageUnit.KMPL: 1.0,
+    MileageUnit.MPG_US: 2.352145,
+    MileageUnit.MPG_UK: 2.82481,
+}
+
+
+def convert_fuel_quantity_values(values, from_unit: FuelUnit, to_unit: FuelUnit):
+    if from_unit not in LITRES_PER_FUEL_UNIT or to_unit not in LITRES_PER_FUEL_UNIT:
+        raise ValueError(f"Unsupported FuelUnit: {from_unit} -> {to_unit}")
+    if from_unit == to_unit:
+        return values
+    return values * LITRES_PER_FUEL_UNIT[from_unit] / LITRES_PER_FUEL_UNIT[to_unit]
+
+
+def convert_fuel_price_values(values, from_unit: FuelUnit, to_unit: FuelUnit):
+    return convert_fuel_quantity_values(values, to_unit, from_unit)
+
+
+def convert_distance_values(values, from_unit: DistanceUnit, to_unit: DistanceUnit):
+    if from_unit not in KM_PER_DISTANCE_UNIT or to_unit not in KM_PER_DISTANCE_UNIT:
+        raise ValueError(f"Unsupported DistanceUnit: {from_unit} -> {to_unit}")
+    if from_unit == to_unit:
+        return values
+    return values * KM_PER_DISTANCE_UNIT[from_unit] / KM_PER_DISTANCE_UNIT[to_unit]
+
+
+def convert_mileage_values(values, from_unit: MileageUnit, to_unit: MileageUnit):
+    if from_unit == to_unit:
+        return values
+    if from_unit == MileageUnit.L_100KM:
+        kmpl = 100 / values
+    elif from_unit in KMPL_PER_MILEAGE_UNIT:
+        kmpl = values * KMPL_PER_MILEAGE_UNIT[from_unit]
+    else:
+        raise ValueError(f"Unsupported MileageUnit: {from_unit}")
+
+    if to_unit == MileageUnit.L_100KM:
+        return 100 / kmpl
+    elif to_unit in MILEAGE_UNIT_PER_KMPL:
+        return kmpl * MILEAGE_UNIT_PER_KMPL[to_unit]
+    else:
+        raise ValueError(f"Unsupported MileageUnit: {to_unit}")
 
 
 def convert_to_litre(fuel: FuelQuantity) -> FuelQuantity:
     if fuel.unit == FuelUnit.L:
         return fuel
-    elif fuel.unit == FuelUnit.USGa:
-        return FuelQuantity(value=round(fuel.value * 3.785, 2), unit=FuelUnit.L)
-    elif fuel.unit == FuelUnit.UKGa:
-        return FuelQuantity(value=round(fuel.value * 4.546, 2), unit=FuelUnit.L)
-    else:
-        raise ValueError(f"Unsupported FuelUnit: {FuelUnit}")
+    return FuelQuantity(value=round(convert_fuel_quantity_values(fuel.value, fuel.unit, FuelUnit.L), 2), unit=FuelUnit.L)
     
 
 def convert_from_litre(fuel: FuelQuantity, target_unit: FuelUnit) -> FuelQuantity:
@@ -115,51 +208,38 @@ def convert_from_litre(fuel: FuelQuantity, target_unit: FuelUnit) -> FuelQuantit
         raise TypeError(f"Unsupported unit: {fuel.unit}. Input to this function should have type {FuelUnit.L}") 
     elif target_unit == FuelUnit.L:
         return fuel
-    elif target_unit == FuelUnit.USGa:
-        return FuelQuantity(value=round(fuel.value / 3.785, 2), unit=target_unit)
-    elif target_unit == FuelUnit.UKGa:
-        return FuelQuantity(value=round(fuel.value / 4.546, 2), unit=target_unit)
-    else:
-        raise ValueError(f"Unsupported MileageUnit: {FuelUnit}")
+    return FuelQuantity(value=round(convert_fuel_quantity_values(fuel.value, FuelUnit.L, target_unit), 2), unit=target_unit)
 
 
 def convert_fuel_quantity(fuel: FuelQuantity, target_unit: FuelUnit) -> FuelQuantity:
     if fuel.unit == target_unit:
         return fuel
-    return convert_from_litre(convert_to_litre(fuel), target_unit)
+    litres = fuel.value
+    if fuel.unit != FuelUnit.L:
+        litres = round(convert_fuel_quantity_values(litres, fuel.unit, FuelUnit.L), 2)
+    if target_unit != FuelUnit.L:
+        litres = round(convert_fuel_quantity_values(litres, FuelUnit.L, target_unit), 2)
+    return FuelQuantity(value=litres, unit=target_unit)
 
 
 def convert_fuel_price(fuel_price: FuelPrice, target_unit: FuelUnit) -> FuelPrice:
-    def convert_to_per_liter(fuel_price: FuelPrice) -> FuelPrice:
-        if fuel_price.per_unit == FuelUnit.L:
-            return fuel_price
-        value = round(fuel_price.value / convert_to_litre(FuelQuantity(value=1, unit=fuel_price.per_unit)).value, 2)
-        return FuelPrice(value=value, per_unit=FuelUnit.L)
-
-    def convert_from_per_liter(fuel_price: FuelPrice, target_unit: FuelUnit) -> FuelPrice:
-        if fuel_price.per_unit == target_unit:
-            return fuel_price
-        value = round(fuel_price.value / convert_from_litre(FuelQuantity(value=1, unit=FuelUnit.L), target_unit).value, 2)
-        return FuelPrice(value=value, per_unit=target_unit)
-
     if fuel_price.per_unit == target_unit:
         return fuel_price
-    return convert_from_per_liter(convert_to_per_liter(fuel_price), target_unit)
+    # Prices go through the per-liter price using the 2 d.p. litres in one unit, and vice versa
+    value = fuel_price.value
+    if fuel_price.per_unit != FuelUnit.L:
+        value = round(value / round(convert_fuel_quantity_values(1, fuel_price.per_unit, FuelUnit.L), 2), 2)
+    if target_unit != FuelUnit.L:
+        value = round(value / round(convert_fuel_quantity_values(1, FuelUnit.L, target_unit), 2), 2)
+    return FuelPrice(value=value, per_unit=target_unit)
 
 
 def convert_to_kmpl(mileage: Mileage) -> Mileage:
     if mileage.unit == MileageUnit.KMPL:
         return Mileage(value=mileage.value, unit=MileageUnit.KMPL)
-    elif mileage.unit == MileageUnit.MPG_US:
-        return Mileage(value=round(mileage.value * 0.425144, 2), unit=MileageUnit.KMPL)
-    elif mileage.unit == MileageUnit.MPG_UK:
-        return Mileage(value=round(mileage.value * 0.354006, 2), unit=MileageUnit.KMPL)
-    elif mileage.unit == MileageUnit.L_100KM:
-        if mileage.value == 0:
-            raise ValueError(f"Value cannot be zero for this conversion")
-        return Mileage(value=round(100 / mileage.value, 2), unit=MileageUnit.KMPL)
-    else:
-        raise ValueError(f"Unsupported MileageUnit: {MileageUnit}")
+    if mileage.unit == MileageUnit.L_100KM and mileage.value == 0:
+        raise ValueError(f"Value cannot be zero for this conversion")
+    return Mileage(value=round(convert_mileage_values(mileage.value, mileage.unit, MileageUnit.KMPL), 2), unit=MileageUnit.KMPL)
 
    
 def convert_from_kmpl(mileage: Mileage, target_unit: MileageUnit) -> Mileage:
@@ -167,20 +247,20 @@ def convert_from_kmpl(mileage: Mileage, target_unit: MileageUnit) -> Mileage:
         raise TypeError(f"Unsupported unit: {mileage.unit}. Input to this function should have type {MileageUnit.KMPL}") 
     elif target_unit == MileageUnit.KMPL:
         return mileage
-    elif target_unit == MileageUnit.MPG_US:
-        return Mileage(value=round(mileage.value * 2.352145, 2), unit=target_unit)
-    elif target_unit == MileageUnit.MPG_UK:
-        return Mileage(value=round(mileage.value * 2.82481, 2), unit=target_unit)
-    elif target_unit == MileageUnit.L_100KM:
-        return Mileage(value=round(100 / mileage.value, 2), unit=target_unit)
-    else:
-        raise ValueError(f"Unsupported MileageUnit: {MileageUnit}")
+    return Mileage(value=round(convert_mileage_values(mileage.value, MileageUnit.KMPL, target_unit), 2), unit=target_unit)
 
 
 def convert_mileage(mileage: Mileage, target_unit: MileageUnit) -> Mileage:
     if mileage.unit == target_unit:
         return mileage
-    return convert_from_kmpl(convert_to_kmpl(mileage), target_unit)
+    if mileage.unit == MileageUnit.L_100KM and mileage.value == 0:
+        raise ValueError(f"Value cannot be zero for this conversion")
+    kmpl = mileage.value
+    if mileage.unit != MileageUnit.KMPL:
+        kmpl = round(convert_mileage_values(kmpl, mileage.unit, MileageUnit.KMPL), 2)
+    if target_unit != MileageUnit.KMPL:
+        kmpl = round(convert_mileage_values(kmpl, MileageUnit.KMPL, target_unit), 2)
+    return Mileage(value=kmpl, unit=target_unit)
 
 
 def list_all(Enum):
@@ -0,0 +1,18 @@
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module that is only imported when one of its attributes is first used."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self._name)
+        # Later lookups find the attribute on the module directly
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
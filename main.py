@@ -1,42 +1,252 @@
+import time
+
+# Timed from the top of the script, so the first run reports how long the imports below took
+SCRIPT_STARTED = time.perf_counter()
+
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import streamlit as st
-import altair as alt
 from streamlit.logger import get_logger
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-from helpers import Distance, DistanceUnit
+import numpy as np
+
+from cache import cache_stats
+from lazy import lazy_import
+from warmup import start_warmup
+from profiling import profiling_enabled, record_frame, record_startup, stage, start_profile, startup_timings, stop_profile, \
+                      track_recomputed
+from defaults import CHART_MAX_POINTS, FLEET_CHART_WORKERS, SETTINGS_MAP
+from helpers import Car, Distance, DistanceUnit, Settings, convert_distance_values
+from graph import ComputationGraph
 from utils import set_page_header_format, collect_basic_details, \
-                  collect_car_details, calculate_distance_fuel_car_could_travel, \
-                  calculate_breakeven_distance, calculate_detailed_cost
+                  collect_car_details, collect_ownership_costs, collect_segment_mileage, collect_drive_profile, \
+                  calculate_distance_fuel_car_could_travel, breakeven_heatmap_axes, PAGE_NODES
+
+# Only needed further down the page, so their imports (and pandas) wait until something is drawn
+alt = lazy_import("altair")
+batch = lazy_import("batch")
+drive_profile = lazy_import("drive_profile")
+fleet = lazy_import("fleet")
+pd = lazy_import("pandas")
+montecarlo = lazy_import("montecarlo")
+tco = lazy_import("tco")
+
+record_startup("imports", time.perf_counter() - SCRIPT_STARTED)
 
 LOGGER = get_logger(__name__)
 
 
+def show_breakeven_heatmap(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    grid = batch.calculate_breakeven_grid(hybrid_car.price, hybrid_car.mileage, fuel_car.price, fuel_car.mileage,
+                                    *breakeven_heatmap_axes(settings),
+                                    settings.pct_fuel_price_hike if settings.sim_fuel_price_hike else 0.0)
+    default_distance = SETTINGS_MAP.get(settings.currency.value).annual_distance.get_value_in(settings.distance_unit).value
+
+    current = grid.iloc[[
+        (abs(grid.fuel_price - settings.fuel_price.get_value_per(settings.fuel_unit).value)
+         + abs(grid.annual_distance - settings.annual_distance.get_value_in(settings.distance_unit).value) / default_distance).idxmin()
+    ]]
+    x = alt.X("fuel_price:O", title=f"Fuel price ({settings.currency.value} / {settings.fuel_unit.name})")
+    y = alt.Y("annual_distance:O", title=f"Annual distance ({settings.distance_unit.value})", sort="descending")
+    heatmap = alt.Chart(grid).mark_rect().encode(
+        x=x, y=y,
+        color=alt.Color("breakeven_years:Q", title="Years", scale=alt.Scale(scheme="redyellowgreen", reverse=True)),
+        tooltip=["fuel_price", "annual_distance", "breakeven_years"],
+    )
+    highlight = alt.Chart(current).mark_rect(fill=None, stroke="white", strokeWidth=2).encode(x=x, y=y)
+    record_frame("heatmap", grid)
+    st.altair_chart(heatmap + highlight)
+
+
+def show_ownership_costs(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    st.write("### Total Cost of Ownership")
+    if not st.checkbox("Include financing, insurance, servicing, battery and resale", value=False, key="ownership"):
+        return
+
+    years, discount = st.columns(2)
+    with years:
+        ownership_years = st.number_input("Years of ownership", min_value=1, max_value=30, step=1, value=settings.ownership_years, key="ownership_years")
+    with discount:
+        discount_rate_pct = st.number_input("Discount rate (% / year)", min_value=0.0, max_value=20.0, step=0.5, format="%.1f",
+                                            value=settings.discount_rate_pct, key="discount_rate")
+    settings = settings.model_copy(update={'ownership_years': ownership_years, 'discount_rate_pct': discount_rate_pct})
+    hybrid_car = hybrid_car.model_copy(update={'ownership': collect_ownership_costs('Hybrid_Car', settings)})
+    fuel_car = fuel_car.model_copy(update={'ownership': collect_ownership_costs('Fuel_Car', settings)})
+
+    yearly, components, breakeven_years = tco.calculate_ownership_cost(fuel_car, hybrid_car, settings)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="NPV break-even in:",
+                  value=f"{breakeven_years:.1f} years" if not np.isnan(breakeven_years) else f"Not within {ownership_years} years")
+    for col, car in [(col2, 'Hybrid Car'), (col3, 'Fuel Car')]:
+        with col:
+            st.metric(label=f"{car} cost over {ownership_years} years (NPV):",
+                      value=f"{settings.currency.name} {round(yearly[car].iloc[-1]):,}")
+    record_frame("ownership_cost", yearly)
+    st.line_chart(yearly, x="year", y=["Hybrid Car", "Fuel Car"])
+    st.dataframe(components.round(0))
+
+
+def show_drive_profile(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    if not st.checkbox("Simulate city and highway driving", value=False, key="drive_profile"):
+        return
+
+    hybrid_car = hybrid_car.model_copy(update={'segment_mileage': collect_segment_mileage(hybrid_car, settings)})
+    fuel_car = fuel_car.model_copy(update={'segment_mileage': collect_segment_mileage(fuel_car, settings)})
+    st.write("##### Driving")
+    trip_log = st.file_uploader(f"Trip log (CSV with day or time, segment and distance in {settings.distance_unit.value})",
+                                type=["csv"], key="trip_log")
+    if trip_log is None:
+        profile = collect_drive_profile(settings)
+        with stage("drive_profile"):
+            result = drive_profile.calculate_drive_profile(fuel_car, hybrid_car, settings, profile)
+    else:
+        try:
+            with stage("drive_profile"):
+                result = drive_profile.simulate_drive_profile(drive_profile.read_trip_log(trip_log, settings.distance_unit),
+                                                              fuel_car, hybrid_car, settings)
+        except ValueError as error:
+            st.error(f"Could not read the trip log: {error}")
+            return
+
+    to_distance_unit = convert_distance_values(1, DistanceUnit.km, settings.distance_unit)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="Break-even at:",
+                  value=f"{round(result['breakeven_km'] * to_distance_unit):,} {settings.distance_unit.value}"
+                        if not np.isnan(result['breakeven_km']) else "Not reached")
+    with col2:
+        st.metric(label="Break-even in:",
+                  value=f"{result['breakeven_years']:.1f} years" if not np.isnan(result['breakeven_years']) else "Not reached")
+    with col3:
+        st.metric(label=f"Fuel saved over {result['total_km'] * to_distance_unit:,.0f} {settings.distance_unit.value}:",
+                  value=f"{settings.currency.name} {round(result['fuel_car_fuel_cost'] - result['hybrid_fuel_cost']):,}")
+    record_frame("drive_profile", result['yearly'])
+    st.line_chart(result['yearly'], x="year", y=["Hybrid Cost", "Non-Hybrid Cost"])
+
+
+def show_fleet_comparison(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    st.write("### Compare Against More Cars")
+    if not st.checkbox("Compare the hybrid against several cars", value=False, key="fleet"):
+        return
+
+    upload = st.file_uploader(f"Cars (CSV with name, price and mileage in {settings.mileage_unit.value}, optionally mileage_unit)",
+                              type=["csv"], key="fleet_upload")
+    try:
+        if upload is not None:
+            competitors = fleet.read_cars(upload, settings.mileage_unit)
+        else:
+            edited = st.data_editor(pd.DataFrame({'name': ["Fuel Car"], 'price': [fuel_car.price], 'mileage': [fuel_car.mileage.value]}),
+                                    num_rows="dynamic", key="fleet_cars")
+            competitors = fleet.cars_from_frame(edited, settings.mileage_unit)
+    except ValueError as error:
+        st.error(f"Could not read the cars: {error}")
+        return
+    if not competitors:
+        return
+
+    hybrid_car = Car(type="Hybrid Car", price=hybrid_car.price, mileage=hybrid_car.mileage)
+    with stage("fleet_comparison"):
+        comparison = fleet.calculate_fleet_comparison(hybrid_car, tuple(competitors), settings)
+    per_distance = convert_distance_values(1, settings.distance_unit, DistanceUnit.km)
+    ranking = comparison['ranking']
+    st.dataframe(pd.DataFrame({
+        'Car': ranking['car'],
+        f'Price ({settings.currency.value})': ranking['price'],
+        f'Cost / {settings.distance_unit.name}': (ranking['cost_per_km'] * per_distance).round(2),
+        f'Savings / year ({settings.currency.value})': ranking['annual_savings'].round(0),
+        f'Break-even ({settings.distance_unit.value})': (ranking['breakeven_km'] / per_distance).round(0),
+        'Break-even (years)': ranking['breakeven_years'].round(1),
+    }), hide_index=True)
+    with st.expander("Break-even years of each car (row) over each other (column)"):
+        st.dataframe(comparison['breakeven_years'].round(1))
+
+    # Each car's series is computed on a worker and the chart redrawn as they arrive, so the first lines
+    # show while the rest are still being costed
+    max_km = fleet.fleet_horizon_km(comparison, settings)
+    placeholder = st.empty()
+    series = []
+    with stage("fleet_chart"), ThreadPoolExecutor(max_workers=FLEET_CHART_WORKERS) as executor:
+        futures = [executor.submit(fleet.calculate_car_cost_series, car, settings, max_km, CHART_MAX_POINTS)
+                   for car in [hybrid_car, *competitors]]
+        for future in as_completed(futures):
+            series.append(future.result())
+            df = pd.concat(series, ignore_index=True)
+            placeholder.altair_chart(alt.Chart(df).mark_line().encode(
+                x=alt.X("km:Q", title="km"), y=alt.Y("cost:Q", title=f"Price and fuel ({settings.currency.value})"),
+                color=alt.Color("car:N", title="Car"), tooltip=["car", "km", "cost"],
+            ))
+    record_frame("fleet_chart", df)
+
+
 def run():
-    set_page_header_format()
-    st.write('')
+    if profiling_enabled(st.query_params):
+        render_profiled_page()
+    else:
+        render_page()
+    if record_startup("first_render", time.perf_counter() - SCRIPT_STARTED):
+        LOGGER.info(json.dumps({"event": "startup", **startup_timings()}))
+    # Warming the cache imports pandas and competes for the GIL, so it waits until the first page is out
+    start_warmup()
 
-    with st.container(border=True):
+
+def render_profiled_page():
+    profile = start_profile()
+    try:
+        render_page()
+    finally:
+        stop_profile()
+        ctx = get_script_run_ctx()
+        LOGGER.info(json.dumps({"event": "rerun_profile", "session_id": ctx.session_id if ctx else None, **profile.as_dict()}))
+        with st.expander("Rerun profile"):
+            st.json(profile.as_dict())
+
+
+def render_page():
+    with stage("page_header"):
+        set_page_header_format()
+        st.write('')
+
+    with st.container(border=True), stage("collect_basic_details"):
         settings = collect_basic_details()
 
-    with st.container(border=True):
-        hybrid_car = collect_car_details('Hybrid_Car', settings)
-        fuel_car = collect_car_details('Fuel_Car', settings)
+    graph = ComputationGraph(PAGE_NODES, st.session_state.setdefault("computation_graph", {}))
+    graph.set_input('settings', settings)
+    graph.set_input('chart_max_points', CHART_MAX_POINTS)
+    track_recomputed(graph.recomputed)
+
+    with st.container(border=True), stage("collect_car_details"):
+        hybrid_car = collect_car_details('Hybrid_Car', settings, graph)
+        fuel_car = collect_car_details('Fuel_Car', settings, graph)
     
+    with st.container(border=True), stage("ownership_cost"):
+        show_ownership_costs(fuel_car, hybrid_car, settings)
+
+    with st.container(border=True):
+        show_fleet_comparison(fuel_car, hybrid_car, settings)
+
     with st.container(border=True):
         st.write("### Comparison Outcome")
         if hybrid_car.price <= fuel_car.price or hybrid_car.standardized_mileage.value <= fuel_car.standardized_mileage.value:
             st.write("Are you sure the numbers are correct? If yes, great news! You are already in the green!")
             return
 
-        no_hybrid_distance, no_hybrid_fuel = calculate_distance_fuel_car_could_travel(fuel_car, hybrid_car, settings)
-        breakeven_distance = calculate_breakeven_distance(fuel_car, hybrid_car, settings)
+        with stage("breakeven"):
+            no_hybrid_distance, no_hybrid_fuel = calculate_distance_fuel_car_could_travel(fuel_car, hybrid_car, settings)
+            breakeven_distance = graph.get('breakeven_distance')
         
-        cost_difference_per_km = round(fuel_car.cost_per_km - hybrid_car.cost_per_km, 2)
-        cost_difference_per_distance = round(cost_difference_per_km / Distance(value=1, unit=DistanceUnit.km).get_value_in(settings.distance_unit).value, 2)
+        if settings.exact_arithmetic:
+            cost_difference_per_distance = (fuel_car.cost_per_km - hybrid_car.cost_per_km) * convert_distance_values(1, settings.distance_unit, DistanceUnit.km)
+        else:
+            cost_difference_per_km = round(fuel_car.cost_per_km - hybrid_car.cost_per_km, 2)
+            cost_difference_per_distance = round(cost_difference_per_km / Distance(value=1, unit=DistanceUnit.km).get_value_in(settings.distance_unit).value, 2)
 
         col1, col2 = st.columns(2)
         with col1:
             st.metric(label="Fuel car is cheaper by :", 
-                      value=f"{settings.currency.name} {int(hybrid_car.price - fuel_car.price):,}")
+                      value=f"{settings.currency.name} {int(graph.get('price_gap')):,}")
             
         with col2:
             st.metric(label=f"At {settings.currency.name} {settings.fuel_price.value} / {settings.fuel_price.per_unit.name}, enough to buy {round(no_hybrid_fuel.value)} {settings.fuel_unit.value}s of fuel for :",
@@ -55,7 +265,7 @@ def run():
                       value=f"{round(breakeven_distance.get_value_in(settings.distance_unit).value / settings.annual_distance.get_value_in(settings.distance_unit).value, 1)} years")
         
         with col3:
-            st.metric(label=f"Diff of {settings.currency.name} {cost_difference_per_distance} per {settings.distance_unit.name}, saves you:", 
+            st.metric(label=f"Diff of {settings.currency.name} {cost_difference_per_distance:.2f} per {settings.distance_unit.name}, saves you:", 
                       value=f"{settings.currency.name} {round(settings.annual_distance.value * cost_difference_per_distance):,} / year")
 
         if not settings.sim_fuel_price_hike:
@@ -63,9 +273,16 @@ def run():
 
         if settings.sim_fuel_price_hike:
             st.divider()
-            df, inc_breakeven_distance, inc_years, inc_fuel_price = calculate_detailed_cost(fuel_car, hybrid_car, settings)
+            with stage("detailed_cost"):
+                inc_breakeven_distance, inc_years, inc_fuel_price = graph.get('hike_breakeven')
+                df = graph.get('chart_series')
+            record_frame("cost_chart", df)
             
-            st.write(f"If the average fuel price increases {settings.pct_fuel_price_hike}% per year :")
+            source = settings.fuel_price_source
+            if source is None:
+                st.write(f"If the average fuel price increases {settings.pct_fuel_price_hike}% per year :")
+            else:
+                st.write(f"If fuel prices follow {source.region}'s from {source.start_year}, then increase {settings.pct_fuel_price_hike}% per year :")
             col1, col2, col3 = st.columns([1.75, 2, 2])
             with col1:
                 st.metric(label=f"Break-even at:", 
@@ -73,19 +290,56 @@ def run():
                 
             with col2:
                 st.metric(label=f"At {int(settings.annual_distance.get_value_in(settings.distance_unit).value):,} {settings.distance_unit.value} per year, break-even in:", 
-                          value=f"{inc_years} years")
+                          value=f"{inc_years:.1f} years")
 
             with col3:
                 st.metric(label=f"After {int(inc_years)} years, fuel would be:", 
-                          value=f"{settings.currency.value} {inc_fuel_price.get_value_per(settings.fuel_unit).value} / {settings.fuel_unit.name}")
+                          value=f"{settings.currency.value} {inc_fuel_price.get_value_per(settings.fuel_unit).value:.2f} / {settings.fuel_unit.name}")
             st.divider()
             st.markdown("""##### Cost Comparison by Kilometers""")
-            st.line_chart(df, x="km", y=["Hybrid Cost", "Non-Hybrid Cost"])
+            with stage("cost_chart"):
+                st.line_chart(df, x="km", y=["Hybrid Cost", "Non-Hybrid Cost"])
+
+            st.divider()
+            st.markdown("""##### Fuel Price Uncertainty""")
+            col1, col2 = st.columns(2)
+            with col1:
+                volatility = st.number_input("Yearly fuel price volatility (%)", min_value=0.0, max_value=50.0, step=1.0,
+                                             format="%.1f", value=10.0, key="fuel_price_volatility")
+            with col2:
+                within_years = st.number_input("Break even within (years)", min_value=1, max_value=50, step=1,
+                                               value=min(50, max(1, round(inc_years))), key="within_years")
+            with stage("monte_carlo"):
+                distribution = montecarlo.calculate_breakeven_distribution(fuel_car, hybrid_car, settings, volatility, within_years)
+
+            col1, col2, col3, col4 = st.columns(4)
+            for col, label, key in [(col1, "Optimistic (P10)", 'p10'), (col2, "Median (P50)", 'p50'), (col3, "Pessimistic (P90)", 'p90')]:
+                with col:
+                    st.metric(label=f"{label} break-even in:",
+                              value=f"{distribution[key]:.1f} years" if distribution[key] != float('inf') else "Not reached")
+            with col4:
+                st.metric(label=f"Chance of breaking even within {within_years} years:",
+                          value=f"{distribution['prob_within']:.0%}")
+            st.caption(f"Based on {distribution['num_paths']:,} simulated fuel price paths of up to 50 years.")
+
+        st.divider()
+        st.markdown("""##### City and Highway Driving""")
+        show_drive_profile(fuel_car, hybrid_car, settings)
+
+        st.divider()
+        st.markdown("""##### Break-even Years by Fuel Price and Annual Distance""")
+        with stage("heatmap"):
+            show_breakeven_heatmap(fuel_car, hybrid_car, settings)
 
                         
-    st.caption("""Note: Above calculations do not take into consideration other factors such as Cost of Ownership""")
+    st.caption("""Note: The Comparison Outcome counts purchase price and fuel only. Financing, insurance, servicing, battery replacement and resale are in the Total Cost of Ownership section.""")
     st.write(' ')
     st.write(' ')
+
+    LOGGER.debug("Calculation cache stats: %s", cache_stats())
+    if "cache_stats" in st.query_params:
+        with st.expander("Calculation cache"):
+            st.json(cache_stats())
     
 
 
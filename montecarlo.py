@@ -0,0 +1,77 @@
+import math
+import time
+
+import numpy as np
+
+from cache import memoize
+from defaults import MONTE_CARLO_BUDGET_SECONDS, MONTE_CARLO_MAX_PATHS, MONTE_CARLO_MIN_PATHS, MONTE_CARLO_SEED
+from exact import exact_kmpl, exact_price_per_litre
+from helpers import Car, DistanceUnit, Settings
+from utils import solve_breakeven_km, yearly_fuel_price_schedule
+
+# Paths simulated per second, measured once per process on first use
+_paths_per_second = None
+
+
+def simulate_fuel_price_paths(yearly_fuel_price: np.ndarray, volatility: float, num_paths: int,
+                              seed: int = MONTE_CARLO_SEED, exact_arithmetic: bool = False) -> np.ndarray:
+    """(num_paths, years) yearly prices with log-normal shocks whose mean path is `yearly_fuel_price`.
+
+    Rows only depend on the seed, so a larger sample extends a smaller one instead of replacing it.
+    """
+    yearly_fuel_price = np.asarray(yearly_fuel_price, dtype=float)
+    sigma = volatility / 100
+    shocks = np.random.default_rng(seed).standard_normal((num_paths, len(yearly_fuel_price) - 1))
+    paths = np.empty((num_paths, len(yearly_fuel_price)))
+    paths[:, 0] = 0
+    np.cumsum(sigma * shocks - sigma ** 2 / 2, axis=1, out=paths[:, 1:])
+    paths = yearly_fuel_price * np.exp(paths)
+    return paths if exact_arithmetic else np.round(paths, 2)
+
+
+def simulate_breakeven_years(fuel_car: Car, hybrid_car: Car, settings: Settings, volatility: float,
+                             num_paths: int, num_years: int) -> np.ndarray:
+    """Break-even year (fractional) for each simulated price path, inf where it is not reached in `num_years`.
+
+    Paths are centred on the same yearly prices as the deterministic break-even, a region's included.
+    """
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    hybrid_kmpl, fuel_car_kmpl = hybrid_car.standardized_mileage.value, fuel_car.standardized_mileage.value
+    if settings.exact_arithmetic:
+        hybrid_kmpl, fuel_car_kmpl = exact_kmpl(hybrid_car.mileage), exact_kmpl(fuel_car.mileage)
+    if settings.exact_arithmetic and settings.fuel_price_source is None:
+        # As calculate_exact_breakeven_with_price_hike compounds it, unrounded
+        yearly_fuel_price = exact_price_per_litre(settings.fuel_price) * (1 + settings.pct_fuel_price_hike / 100) ** np.arange(num_years)
+    else:
+        yearly_fuel_price = yearly_fuel_price_schedule(settings, num_years)
+    paths = simulate_fuel_price_paths(yearly_fuel_price, volatility, num_paths, exact_arithmetic=settings.exact_arithmetic)
+    km, year = solve_breakeven_km(hybrid_car.price - fuel_car.price, hybrid_kmpl, fuel_car_kmpl, paths, annual_km)
+    return np.where(year > 0, year - 1 + (km % annual_km) / annual_km, np.inf)
+
+
+def adaptive_num_paths(num_years: int, budget_seconds: float = MONTE_CARLO_BUDGET_SECONDS) -> int:
+    """Largest power-of-two sample count expected to finish within the latency budget."""
+    global _paths_per_second
+    if _paths_per_second is None:
+        pilot_paths = MONTE_CARLO_MIN_PATHS
+        started = time.perf_counter()
+        solve_breakeven_km(1.0, 2.0, 1.0, simulate_fuel_price_paths(1.025 ** np.arange(50), 10, pilot_paths), 1.0)
+        _paths_per_second = pilot_paths * 50 / max(time.perf_counter() - started, 1e-6)
+    affordable = _paths_per_second * budget_seconds / num_years
+    return int(min(max(2 ** int(math.log2(max(affordable, 1))), MONTE_CARLO_MIN_PATHS), MONTE_CARLO_MAX_PATHS))
+
+
+@memoize()
+def calculate_breakeven_distribution(fuel_car: Car, hybrid_car: Car, settings: Settings, volatility: float,
+                                     within_years: float, num_years: int = 50) -> dict:
+    num_paths = adaptive_num_paths(num_years)
+    years = simulate_breakeven_years(fuel_car, hybrid_car, settings, volatility, num_paths, num_years)
+    # Paths that never break even are inf, so interpolating between ranks could give nan
+    p10, p50, p90 = np.percentile(years, [10, 50, 90], method='nearest')
+    return {
+        'num_paths': num_paths,
+        'p10': float(p10),
+        'p50': float(p50),
+        'p90': float(p90),
+        'prob_within': float(np.mean(years <= within_years)),
+    }
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+# Profiling is opt-in: set BREAKEVEN_PROFILE=1 for every session, or add ?profile to the page URL
+PROFILE_ENV_VAR = "BREAKEVEN_PROFILE"
+
+# Each Streamlit session reruns its script on its own thread, so the active profile is thread-local
+_local = threading.local()
+
+# Timings of the process's first script run, in ms
+_startup = {}
+
+# Classes whose constructions are counted, and how many profiles are running. The counting __init__ is
+# only patched in while one is, so runs without a profile construct models at full speed
+_counted_classes = []
+_running_profiles = 0
+_counting_lock = threading.Lock()
+
+
+class RerunProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_seconds = None
+        self.stages = {}
+        self.model_counts = Counter()
+        self.frames = {}
+        self.recomputed_nodes = []
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def record_frame(self, name: str, df) -> None:
+        self.frames[name] = {'rows': len(df), 'bytes': int(df.memory_usage(deep=True).sum())}
+
+    def finish(self) -> None:
+        self.total_seconds = time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            'total_ms': round((self.total_seconds or 0.0) * 1e3, 3),
+            'stages_ms': {name: round(seconds * 1e3, 3) for name, seconds in self.stages.items()},
+            'model_constructions': dict(self.model_counts),
+            'frames': self.frames,
+            'recomputed_nodes': list(self.recomputed_nodes),
+            'startup_ms': startup_timings(),
+        }
+
+
+def profiling_enabled(query_params=None) -> bool:
+    return os.environ.get(PROFILE_ENV_VAR, "") not in ("", "0") or (query_params is not None and "profile" in query_params)
+
+
+def count_models(cls):
+    """Class decorator counting constructions of `cls` and its subclasses into the running profile."""
+    _counted_classes.append(cls)
+    if _running_profiles:
+        _patch_init(cls)
+    return cls
+
+
+def _patch_init(cls) -> None:
+    init = cls.__init__
+
+    def counting_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        count_model(self)
+
+    counting_init.original = cls.__dict__.get('__init__')
+    cls.__init__ = counting_init
+
+
+def _unpatch_init(cls) -> None:
+    original = cls.__init__.original
+    if original is None:
+        del cls.__init__
+    else:
+        cls.__init__ = original
+
+
+def start_profile() -> RerunProfile:
+    global _running_profiles
+    if current_profile() is None:
+        with _counting_lock:
+            _running_profiles += 1
+            if _running_profiles == 1:
+                for cls in _counted_classes:
+                    _patch_init(cls)
+    _local.profile = RerunProfile()
+    return _local.profile
+
+
+def stop_profile() -> Optional[RerunProfile]:
+    global _running_profiles
+    profile = current_profile()
+    _local.profile = None
+    if profile is not None:
+        profile.finish()
+        with _counting_lock:
+            _running_profiles -= 1
+            if _running_profiles == 0:
+                for cls in _counted_classes:
+                    _unpatch_init(cls)
+    return profile
+
+
+def current_profile() -> Optional[RerunProfile]:
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def stage(name: str):
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
+
+
+def count_model(model) -> None:
+    profile = current_profile()
+    if profile is not None:
+        profile.model_counts[type(model).__name__] += 1
+
+
+def record_frame(name: str, df) -> None:
+    profile = current_profile()
+    if profile is not None:
+        profile.record_frame(name, df)
+
+
+def track_recomputed(recomputed_nodes: list) -> None:
+    # Keeps the list itself, so the profile reports every node the graph recomputes before the rerun ends
+    profile = current_profile()
+    if profile is not None:
+        profile.recomputed_nodes = recomputed_nodes
+
+
+def record_startup(name: str, seconds: float) -> bool:
+    """Keeps the first timing recorded under `name` in this process, returning whether this was it."""
+    if name in _startup:
+        return False
+    _startup[name] = round(seconds * 1e3, 3)
+    return True
+
+
+def startup_timings() -> dict:
+    return dict(_startup)
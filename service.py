@@ -0,0 +1,198 @@
+"""Headless HTTP/JSON service for the break-even engine.
+
+    python service.py --port 8080
+
+POST /breakeven with one scenario object or a list of them:
+
+    {"currency": "AUD", "fuel_price": {"value": 2.0, "per_unit": "Liter"}, "pct_fuel_price_hike": 2.5,
+     "annual_distance": {"value": 15000, "unit": "km"},
+     "hybrid_car": {"type": "Hybrid_Car", "price": 45000, "mileage": {"value": 4, "unit": "L/100km"}},
+     "fuel_car": {"type": "Fuel_Car", "price": 40000, "mileage": {"value": 6, "unit": "L/100km"}}}
+
+Scenarios from concurrent requests are coalesced into one batch.evaluate_scenarios call.
+GET /health reports how many requests and batches have been served.
+"""
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pydantic
+
+from batch import evaluate_scenarios
+from helpers import Car, Currency, Distance, DistanceUnit, FuelPrice, MileageUnit, Model, convert_distance_values
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BreakevenRequest(Model):
+    currency: Currency
+    fuel_price: FuelPrice
+    sim_fuel_price_hike: bool = True
+    pct_fuel_price_hike: float = 0.0
+    annual_distance: Distance
+    hybrid_car: Car
+    fuel_car: Car
+
+
+class BreakevenRequestList(pydantic.RootModel):
+    root: List[BreakevenRequest]
+
+
+def to_scenarios(requests: List[BreakevenRequest]) -> pd.DataFrame:
+    return pd.DataFrame({
+        'hybrid_price': [request.hybrid_car.price for request in requests],
+        'fuel_car_price': [request.fuel_car.price for request in requests],
+        # Cars may use different mileage units, so both go in as the standardized km/L the UI uses
+        'hybrid_mileage': [request.hybrid_car.standardized_mileage.value for request in requests],
+        'fuel_car_mileage': [request.fuel_car.standardized_mileage.value for request in requests],
+        'mileage_unit': MileageUnit.KMPL,
+        'fuel_price': [request.fuel_price.value for request in requests],
+        'fuel_unit': [request.fuel_price.per_unit for request in requests],
+        'annual_distance': [request.annual_distance.value for request in requests],
+        'distance_unit': [request.annual_distance.unit for request in requests],
+        'pct_fuel_price_hike': [request.pct_fuel_price_hike if request.sim_fuel_price_hike else 0.0 for request in requests],
+    })
+
+
+def check_convertible(requests: List[BreakevenRequest]) -> None:
+    """Raises ValueError for a request whose mileages cannot be standardized, e.g. 0 L/100km, before it joins
+    a batch it would fail as a whole. The conversions are cached on the cars, so to_scenarios reuses them."""
+    for request in requests:
+        for car in (request.hybrid_car, request.fuel_car):
+            car.standardized_mileage
+
+
+def to_responses(requests: List[BreakevenRequest], results: pd.DataFrame) -> List[dict]:
+    def clean(value):
+        return None if value is None or not np.isfinite(value) else round(float(value), 2)
+
+    responses = []
+    for request, result in zip(requests, results.itertuples(index=False)):
+        unit = request.annual_distance.unit
+        response = {
+            'currency': request.currency.value,
+            'distance_unit': unit.value,
+            'breakeven_distance': clean(convert_distance_values(result.breakeven_km, DistanceUnit.km, unit)),
+            'breakeven_years': clean(result.breakeven_years),
+            'annual_savings': clean(result.annual_savings),
+        }
+        if request.sim_fuel_price_hike:
+            response['hike_breakeven_distance'] = clean(convert_distance_values(result.hike_breakeven_km, DistanceUnit.km, unit))
+            response['hike_breakeven_years'] = clean(result.hike_breakeven_years)
+        responses.append(response)
+    return responses
+
+
+class Batcher:
+    """Collects scenarios from concurrent requests and evaluates them together on one worker thread."""
+
+    def __init__(self, max_batch: int = 10_000, max_wait: float = 0.005):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests_served = 0
+        self.batches_run = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, requests: List[BreakevenRequest]) -> Future:
+        future = Future()
+        self._queue.put((requests, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    pending.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+                size += len(pending[-1][0])
+            self._evaluate(pending)
+
+    def _evaluate(self, pending):
+        requests = [request for batch, _ in pending for request in batch]
+        try:
+            responses = to_responses(requests, evaluate_scenarios(to_scenarios(requests)))
+        except Exception as error:
+            for _, future in pending:
+                future.set_exception(error)
+            return
+        self.batches_run += 1
+        self.requests_served += len(pending)
+        start = 0
+        for batch, future in pending:
+            future.set_result(responses[start:start + len(batch)])
+            start += len(batch)
+
+
+def make_handler(batcher: Batcher):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self._send(404, {'error': f"Unknown path: {self.path}"})
+            self._send(200, {'status': 'ok', 'requests': batcher.requests_served, 'batches': batcher.batches_run})
+
+        def do_POST(self):
+            if self.path != '/breakeven':
+                return self._send(404, {'error': f"Unknown path: {self.path}"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+                single = isinstance(body, dict)
+                requests = BreakevenRequestList.model_validate([body] if single else body).root
+                check_convertible(requests)
+            except (ValueError, pydantic.ValidationError) as error:
+                return self._send(400, {'error': str(error)})
+            try:
+                responses = batcher.submit(requests).result() if requests else []
+            except Exception as error:
+                LOGGER.exception("Evaluating %d scenarios failed", len(requests))
+                return self._send(500, {'error': str(error)})
+            self._send(200, responses[0] if single else responses)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of concurrent clients are the point of batching, so allow a deep accept backlog
+    request_queue_size = 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch', type=int, default=10_000, help="scenarios evaluated together at most")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="how long a batch waits for more requests")
+    args = parser.parse_args(argv)
+
+    batcher = Batcher(args.max_batch, args.max_wait_ms / 1000)
+    server = Server((args.host, args.port), make_handler(batcher))
+    print(f"Serving break-even engine on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
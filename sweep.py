@@ -0,0 +1,168 @@
+"""Sensitivity sweep over fuel price x yearly hike x annual distance x price gap for one car pair.
+
+The grid is never materialized: each chunk is a range of flat grid indices that a worker process
+unravels, evaluates with batch.evaluate_scenarios and writes to its own CSV file. Finished chunk
+files are skipped on the next run, so an interrupted sweep resumes where it stopped.
+
+    python sweep.py out/ --hybrid-mileage 4 --fuel-car-mileage 6 --mileage-unit L/100km \\
+        --fuel-price 1.5:2.5:0.01 --pct-fuel-price-hike 0:10:0.1 --annual-distance 5000:40000:500 \\
+        --price-gap 1000:20000:100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from batch import evaluate_scenarios
+from helpers import DistanceUnit, FuelUnit, MileageUnit, list_all
+
+AXES = ['fuel_price', 'pct_fuel_price_hike', 'annual_distance', 'price_gap']
+MANIFEST = 'sweep.json'
+
+
+def parse_axis(spec: str) -> List[float]:
+    """Parses `start:stop:step` (stop inclusive) or a comma separated list of values."""
+    if ':' in spec:
+        start, stop, step = (float(value) for value in spec.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 6).tolist()
+    return [float(value) for value in spec.split(',')]
+
+
+def grid_size(grid: Dict) -> int:
+    return int(np.prod([len(grid['axes'][axis]) for axis in AXES]))
+
+
+def build_chunk(grid: Dict, start: int, stop: int) -> pd.DataFrame:
+    axes = [np.asarray(grid['axes'][axis]) for axis in AXES]
+    indices = np.unravel_index(np.arange(start, stop), [len(values) for values in axes])
+    values = {axis: axis_values[index] for axis, axis_values, index in zip(AXES, axes, indices)}
+    car = grid['car']
+    return pd.DataFrame({
+        'hybrid_price': car['fuel_car_price'] + values['price_gap'],
+        'fuel_car_price': car['fuel_car_price'],
+        'hybrid_mileage': car['hybrid_mileage'],
+        'fuel_car_mileage': car['fuel_car_mileage'],
+        'mileage_unit': car['mileage_unit'],
+        'fuel_price': values['fuel_price'],
+        'fuel_unit': car['fuel_unit'],
+        'annual_distance': values['annual_distance'],
+        'distance_unit': car['distance_unit'],
+        'pct_fuel_price_hike': values['pct_fuel_price_hike'],
+    }, index=pd.RangeIndex(start, stop, name='grid_index'))
+
+
+def run_chunk(grid: Dict, out_dir: str, chunk_number: int, start: int, stop: int) -> int:
+    scenarios = build_chunk(grid, start, stop)
+    results = evaluate_scenarios(scenarios, max_years=grid['max_years'])
+    results.insert(0, 'price_gap', scenarios.hybrid_price - scenarios.fuel_car_price)
+    for axis in ['annual_distance', 'pct_fuel_price_hike', 'fuel_price']:
+        results.insert(0, axis, scenarios[axis])
+
+    path = chunk_path(out_dir, chunk_number, grid['format'])
+    if grid['format'] == 'parquet':
+        results.to_parquet(path + '.tmp', engine='pyarrow')
+    else:
+        results.to_csv(path + '.tmp', float_format='%.6g')
+    os.replace(path + '.tmp', path)
+    return len(results)
+
+
+def chunk_path(out_dir: str, chunk_number: int, file_format: str) -> str:
+    return os.path.join(out_dir, f"chunk-{chunk_number:06d}.{file_format}")
+
+
+def load_or_write_manifest(grid: Dict, out_dir: str) -> None:
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            if json.load(f) != grid:
+                raise ValueError(f"{out_dir} holds a different sweep; use a new output directory")
+        return
+    with open(path, 'w') as f:
+        json.dump(grid, f, indent=2)
+
+
+def run_sweep(grid: Dict, out_dir: str, workers: int = None, log=sys.stderr) -> int:
+    os.makedirs(out_dir, exist_ok=True)
+    load_or_write_manifest(grid, out_dir)
+
+    total, chunk_size = grid_size(grid), grid['chunk_size']
+    chunks = [(number, start, min(start + chunk_size, total))
+              for number, start in enumerate(range(0, total, chunk_size))
+              if not os.path.exists(chunk_path(out_dir, number, grid['format']))]
+    done = total - sum(stop - start for _, start, stop in chunks)
+    if done:
+        print(f"Resuming: {done:,} of {total:,} grid points already done", file=log)
+
+    workers = workers or os.cpu_count()
+    started, evaluated = time.perf_counter(), 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only a few chunks are queued per worker so pending results never pile up in memory
+        max_pending = 2 * workers
+        pending, queue = set(), iter(chunks)
+        while True:
+            for number, start, stop in queue:
+                pending.add(executor.submit(run_chunk, grid, out_dir, number, start, stop))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                evaluated += future.result()
+            elapsed = time.perf_counter() - started
+            print(f"{done + evaluated:,}/{total:,} points, {evaluated / elapsed:,.0f} points/s", file=log)
+    return evaluated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('out_dir')
+    parser.add_argument('--hybrid-mileage', type=float, required=True)
+    parser.add_argument('--fuel-car-mileage', type=float, required=True)
+    parser.add_argument('--mileage-unit', choices=list_all(MileageUnit), default=MileageUnit.KMPL.value)
+    parser.add_argument('--fuel-unit', choices=list_all(FuelUnit), default=FuelUnit.L.value)
+    parser.add_argument('--distance-unit', choices=list_all(DistanceUnit), default=DistanceUnit.km.value)
+    parser.add_argument('--fuel-car-price', type=float, default=0.0)
+    for axis in AXES:
+        parser.add_argument(f"--{axis.replace('_', '-')}", required=True, help="start:stop:step or a,b,c")
+    parser.add_argument('--max-years', type=int, default=100)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="parquet is much faster to write but needs pyarrow installed")
+    args = parser.parse_args(argv)
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet needs pyarrow: pip install pyarrow")
+
+    grid = {
+        'car': {
+            'hybrid_mileage': args.hybrid_mileage,
+            'fuel_car_mileage': args.fuel_car_mileage,
+            'mileage_unit': args.mileage_unit,
+            'fuel_unit': args.fuel_unit,
+            'distance_unit': args.distance_unit,
+            'fuel_car_price': args.fuel_car_price,
+        },
+        'axes': {axis: parse_axis(getattr(args, axis)) for axis in AXES},
+        'max_years': args.max_years,
+        'chunk_size': args.chunk_size,
+        'format': args.format,
+    }
+    started = time.perf_counter()
+    evaluated = run_sweep(grid, args.out_dir, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Evaluated {evaluated:,} points in {elapsed:.1f}s ({evaluated / max(elapsed, 1e-9):,.0f} points/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
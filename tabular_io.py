@@ -0,0 +1,44 @@
+"""Chunked reading and writing of CSV and Parquet files, shared by the command-line tools and the page.
+
+Parquet needs pyarrow, which is only imported when a Parquet file is read or written.
+"""
+from typing import Iterator
+
+import pandas as pd
+
+
+def is_parquet(path) -> bool:
+    # Also takes open files, such as a page upload, by their name
+    return str(getattr(path, 'name', path)).lower().endswith(('.parquet', '.pq'))
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a' if self._wrote_header else 'w', header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
@@ -0,0 +1,148 @@
+"""Total cost of ownership: yearly cash flows of buying, running and selling each car, discounted to NPV.
+
+Every function works on (n,) arrays of cars, or scenarios, at once, with years along the last axis.
+"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from cache import memoize
+from helpers import Car, DistanceUnit, Settings
+from utils import yearly_fuel_price_schedule
+
+# Yearly cash flow components, in the order they are reported
+COMPONENTS = ['purchase', 'financing', 'fuel', 'insurance', 'servicing', 'battery']
+
+
+def _column(value) -> np.ndarray:
+    return np.asarray(value, dtype=float).reshape(-1, 1)
+
+
+def financed_amount(price, financed_pct, loan_years) -> np.ndarray:
+    # Without a loan term the whole price is paid upfront
+    return np.where(_column(loan_years) > 0, _column(price) * _column(financed_pct) / 100, 0.0)
+
+
+def loan_schedule(principal, rate_pct, loan_years, num_years: int):
+    """Level yearly repayments of the loan, (n, num_years + 1) with nothing due in year 0, and the balance
+    still owed at the end of each year."""
+    principal, rate, loan_years = _column(principal), _column(rate_pct) / 100, _column(loan_years)
+    year = np.arange(num_years + 1)
+    paid_years = np.minimum(year, loan_years)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payment = np.where(rate > 0, principal * rate / (1 - (1 + rate) ** -loan_years), principal / loan_years)
+        balance = np.where(rate > 0, principal * (1 + rate) ** paid_years - payment * ((1 + rate) ** paid_years - 1) / rate,
+                           principal - payment * paid_years)
+    payment = np.where(loan_years > 0, payment, 0.0)
+    payments = np.where((year >= 1) & (year <= loan_years), payment, 0.0)
+    balance = np.where(year < loan_years, balance, 0.0)
+    return payments, balance
+
+
+def cash_flows(price, kmpl, yearly_fuel_price, annual_km, financed_pct, loan_rate_pct, loan_years, insurance_per_year,
+               servicing_per_year, battery_replacement_cost, battery_replacement_year, num_years: int) -> Dict[str, np.ndarray]:
+    """Undiscounted outflows of each component, (n, num_years + 1) with the purchase in year 0.
+
+    `yearly_fuel_price` is per litre with shape (num_years,) or (n, num_years).
+    """
+    price = _column(price)
+    principal = financed_amount(price, financed_pct, loan_years)
+    year = np.arange(num_years + 1)
+    running = year >= 1
+
+    fuel = np.zeros((len(price), num_years + 1))
+    fuel[:, 1:] = _column(annual_km) / _column(kmpl) * np.asarray(yearly_fuel_price, dtype=float)[..., :num_years]
+    financing, _ = loan_schedule(principal, loan_rate_pct, loan_years, num_years)
+    return {
+        'purchase': np.where(year == 0, price - principal, 0.0),
+        'financing': financing,
+        'fuel': fuel,
+        'insurance': np.where(running, _column(insurance_per_year), 0.0),
+        'servicing': np.where(running, _column(servicing_per_year), 0.0),
+        'battery': np.where(running & (year == _column(battery_replacement_year)), _column(battery_replacement_cost), 0.0),
+    }
+
+
+def discount_factors(discount_rate_pct, num_years: int) -> np.ndarray:
+    return (1 + _column(discount_rate_pct) / 100) ** -np.arange(num_years + 1)
+
+
+def npv_cost_if_sold(flows: Dict[str, np.ndarray], price, depreciation_pct, financed_pct, loan_rate_pct, loan_years,
+                     discount_rate_pct, num_years: int) -> np.ndarray:
+    """Net present cost of buying a car and selling it at the end of each year, (n, num_years + 1).
+
+    Selling repays what is left of the loan out of the resale value. Cars without a depreciation rate
+    (NaN) are never resold, so their cost starts at the full price.
+    """
+    price, depreciation = _column(price), _column(depreciation_pct) / 100
+    discount = discount_factors(discount_rate_pct, num_years)
+    outflows = np.cumsum(sum(flows.values()) * discount, axis=-1)
+
+    year = np.arange(num_years + 1)
+    resale = np.where(~np.isnan(depreciation), price * (1 - np.nan_to_num(depreciation)) ** year, 0.0)
+    _, balance = loan_schedule(financed_amount(price, financed_pct, loan_years), loan_rate_pct, loan_years, num_years)
+    return outflows + (balance - resale) * discount
+
+
+def npv_breakeven_years(cost: np.ndarray, other_cost: np.ndarray) -> np.ndarray:
+    """Fractional year from which `cost` stays below `other_cost`, interpolating linearly within a year.
+
+    NaN where it is still above at the horizon.
+    """
+    savings = np.asarray(other_cost) - np.asarray(cost)
+    ahead = savings > 0
+    # The last year it is behind; break-even is the year after that, if it stays ahead to the horizon
+    behind_from_end = np.argmax(~ahead[..., ::-1], axis=-1)
+    last_behind = savings.shape[-1] - 1 - behind_from_end
+    never_behind = ahead.all(axis=-1)
+    last_behind = np.where(never_behind, -1, last_behind)
+    reached = ahead[..., -1] & (last_behind < savings.shape[-1] - 1)
+
+    idx = np.clip(last_behind, 0, savings.shape[-1] - 2)[..., None]
+    before = np.take_along_axis(savings, idx, -1).squeeze(-1)
+    after = np.take_along_axis(savings, idx + 1, -1).squeeze(-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        years = idx.squeeze(-1) + -before / (after - before)
+    return np.where(never_behind, 0.0, np.where(reached, years, np.nan))
+
+
+def _ownership_arrays(cars) -> Dict[str, np.ndarray]:
+    return {
+        'price': [car.price for car in cars],
+        'kmpl': [car.standardized_mileage.value for car in cars],
+        'financed_pct': [car.ownership.financed_pct for car in cars],
+        'loan_rate_pct': [car.ownership.loan_rate_pct for car in cars],
+        'loan_years': [car.ownership.loan_years for car in cars],
+        'insurance_per_year': [car.ownership.insurance_per_year for car in cars],
+        'servicing_per_year': [car.ownership.servicing_per_year for car in cars],
+        'battery_replacement_cost': [car.ownership.battery_replacement_cost for car in cars],
+        'battery_replacement_year': [car.ownership.battery_replacement_year for car in cars],
+        'depreciation_pct': [np.nan if car.ownership.depreciation_pct is None else car.ownership.depreciation_pct
+                             for car in cars],
+    }
+
+
+@memoize()
+def calculate_ownership_cost(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    """Yearly NPV cost of each car if sold that year, the NPV of each component over the ownership
+    period, and the NPV break-even in years (NaN if not within the period)."""
+    num_years = settings.ownership_years
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    yearly_fuel_price = yearly_fuel_price_schedule(settings, num_years,
+                                                   settings.pct_fuel_price_hike if settings.sim_fuel_price_hike else 0.0)
+    cars = _ownership_arrays([hybrid_car, fuel_car])
+    flows = cash_flows(cars['price'], cars['kmpl'], yearly_fuel_price, annual_km, cars['financed_pct'],
+                       cars['loan_rate_pct'], cars['loan_years'], cars['insurance_per_year'], cars['servicing_per_year'],
+                       cars['battery_replacement_cost'], cars['battery_replacement_year'], num_years)
+    cost = npv_cost_if_sold(flows, cars['price'], cars['depreciation_pct'], cars['financed_pct'], cars['loan_rate_pct'],
+                            cars['loan_years'], settings.discount_rate_pct, num_years)
+
+    yearly = pd.DataFrame({'year': np.arange(num_years + 1), 'Hybrid Car': cost[0], 'Fuel Car': cost[1]})
+    discount = discount_factors(settings.discount_rate_pct, num_years)
+    components = pd.DataFrame({component: (flows[component] * discount).sum(axis=-1) for component in COMPONENTS},
+                              index=['Hybrid Car', 'Fuel Car'])
+    # What selling at the horizon brings back, net of any loan still owed
+    components['resale'] = cost[:, -1] - components.sum(axis=1)
+    breakeven_years = float(npv_breakeven_years(cost[0], cost[1]))
+    return (yearly, components.T, breakeven_years)
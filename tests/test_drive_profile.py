@@ -0,0 +1,29 @@
+import pytest
+
+from drive_profile import read_trip_log
+from helpers import DistanceUnit
+
+
+def write_log(path, rows) -> str:
+    path.write_text("day,distance,segment\n" + "".join(f"{row}\n" for row in rows))
+    return str(path)
+
+
+def test_trips_out_of_order_are_rejected(tmp_path):
+    path = write_log(tmp_path / "trips.csv", ["0,10,city", "1,20,highway", "0.5,5,city"])
+    # Chunks of two, so the trip going back in time starts the second chunk
+    with pytest.raises(ValueError, match="Trip 3"):
+        list(read_trip_log(path, DistanceUnit.km, chunk_size=2))
+
+
+def test_trips_before_day_zero_are_rejected(tmp_path):
+    path = write_log(tmp_path / "trips.csv", ["-1,10,city", "1,20,highway"])
+    with pytest.raises(ValueError, match="Trip 1"):
+        list(read_trip_log(path, DistanceUnit.km))
+
+
+def test_trips_in_order_are_read(tmp_path):
+    path = write_log(tmp_path / "trips.csv", ["0,10,city", "0,5,highway", "2.5,20,highway"])
+    chunks = list(read_trip_log(path, DistanceUnit.km, chunk_size=2))
+    assert [list(chunk['day']) for chunk in chunks] == [[0.0, 0.0], [2.5]]
+    assert [list(chunk['km']) for chunk in chunks] == [[10.0, 5.0], [20.0]]
@@ -0,0 +1,29 @@
+import math
+
+import numpy as np
+
+from defaults import SETTINGS_MAP
+from fleet import calculate_fleet_comparison
+from helpers import Car, DistanceUnit, FuelUnit, Mileage, MileageUnit
+from utils import solve_breakeven_km, yearly_fuel_price_schedule
+
+
+def make_car(name: str, price: int, l_100km: float) -> Car:
+    return Car(type=name, price=price, mileage=Mileage(value=l_100km, unit=MileageUnit.L_100KM))
+
+
+def test_competitor_pairs_break_even_past_the_hybrids_horizon():
+    settings = SETTINGS_MAP['AUD'].model_copy(update={'sim_fuel_price_hike': True, 'pct_fuel_price_hike': 0.0})
+    hybrid_car = make_car('Hybrid', 41_000, 4.0)
+    competitors = (make_car('A', 40_000, 6.0), make_car('B', 30_000, 7.0), make_car('C', 20_000, 8.0))
+    comparison = calculate_fleet_comparison.__wrapped__(hybrid_car, competitors, settings)
+
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    price_per_litre = settings.fuel_price.get_value_per(FuelUnit.L).value
+    kmpl = {car.type: car.standardized_mileage.value for car in competitors}
+    # A over B is about 33 years out at the flat price, well past any of the hybrid's break-evens
+    num_years = math.ceil(10_000 / (round(price_per_litre / kmpl['B'], 2) - round(price_per_litre / kmpl['A'], 2)) / annual_km) + 1
+    km, year = solve_breakeven_km(10_000, kmpl['A'], kmpl['B'], yearly_fuel_price_schedule(settings, num_years), annual_km)
+    assert year > 0
+    assert comparison['breakeven_km'].loc['A', 'B'] == km
+    assert not np.isnan(comparison['breakeven_years'].loc['A', 'B'])
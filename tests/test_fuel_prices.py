@@ -0,0 +1,52 @@
+import pytest
+
+import fuel_prices
+from defaults import SETTINGS_MAP
+from fuel_prices import load_fuel_price_table
+from helpers import Car, Distance, DistanceUnit, FuelPrice, FuelPriceSource, FuelUnit, Mileage, MileageUnit
+from utils import calculate_breakeven_with_price_hike, solve_breakeven_km, yearly_fuel_price_schedule
+
+
+def write_prices(path, rows) -> str:
+    path.write_text("region,currency,date,price\n" + "".join(f"{row}\n" for row in rows))
+    return str(path)
+
+
+def test_region_in_two_currencies_is_rejected(tmp_path):
+    path = write_prices(tmp_path / "prices.csv", ["Georgia,USD,2023-01,0.95", "Georgia,GEL,2023-01,2.90",
+                                                  "Victoria,AUD,2023-01,1.89"])
+    with pytest.raises(ValueError, match="Georgia"):
+        load_fuel_price_table(path)
+
+
+def test_regions_are_listed_by_currency(tmp_path):
+    path = write_prices(tmp_path / "prices.csv", ["Georgia,USD,2023-01,0.95", "Victoria,AUD,2023-01,1.89",
+                                                  "Victoria,AUD,2023-02,1.91"])
+    table = load_fuel_price_table(path)
+    assert table.regions('USD') == ['Georgia']
+    assert table.regions('AUD') == ['Victoria']
+    assert table.price('Victoria', 2023, 2) == 1.91
+
+
+def test_regional_hike_breakeven_when_prices_fall_after_the_first_year(tmp_path, monkeypatch):
+    # Prices drop from 2.00 to 1.2349 after 2020, whose yearly averages round down to 1.23
+    rows = [f"Test,AUD,{year}-{month:02d},{2.0 if year == 2020 else 1.2349}" for year in range(2020, 2041) for month in range(1, 13)]
+    table = load_fuel_price_table(write_prices(tmp_path / "prices.csv", rows))
+    monkeypatch.setattr(fuel_prices, '_table', table)
+    monkeypatch.setattr(fuel_prices, '_table_loaded', True)
+    # A year's distance that puts the break-even at the lowest monthly price just inside year 14, and at
+    # the rounded yearly price in year 15
+    settings = SETTINGS_MAP['AUD'].model_copy(update={
+        'sim_fuel_price_hike': True, 'pct_fuel_price_hike': 0.0, 'fuel_price': FuelPrice(value=2.0, per_unit=FuelUnit.L),
+        'annual_distance': Distance(value=14470, unit=DistanceUnit.km),
+        'fuel_price_source': FuelPriceSource(region='Test', start_year=2020, table=table.fingerprint),
+    })
+    fuel_car, hybrid_car = (Car(type=name, price=price, mileage=Mileage(value=l_100km, unit=MileageUnit.L_100KM))
+                            for name, price, l_100km in [('Fuel_Car', 40000, 6.0), ('Hybrid_Car', 45000, 4.0)])
+    distance, years, fuel_price = calculate_breakeven_with_price_hike.__wrapped__(fuel_car, hybrid_car, settings)
+
+    km, year = solve_breakeven_km(5000, hybrid_car.standardized_mileage.value, fuel_car.standardized_mileage.value,
+                                  yearly_fuel_price_schedule(settings, 30), 14470)
+    assert year == 15
+    assert distance.value == km
+    assert fuel_price.value == 1.23
@@ -0,0 +1,45 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from service import Batcher, Server, make_handler
+
+
+def make_request(hybrid_mileage: float) -> dict:
+    return {
+        "currency": "AUD", "fuel_price": {"value": 2.0, "per_unit": "Liter"}, "pct_fuel_price_hike": 2.5,
+        "annual_distance": {"value": 15000, "unit": "km"},
+        "hybrid_car": {"type": "Hybrid_Car", "price": 45000, "mileage": {"value": hybrid_mileage, "unit": "L/100km"}},
+        "fuel_car": {"type": "Fuel_Car", "price": 40000, "mileage": {"value": 6, "unit": "L/100km"}},
+    }
+
+
+def post(port: int, body) -> tuple:
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/breakeven", data=json.dumps(body).encode(), method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+def test_unconvertible_request_does_not_fail_its_batch():
+    # A long wait, so both requests arrive while the batch is still open
+    batcher = Batcher(max_wait=0.5)
+    server = Server(('127.0.0.1', 0), make_handler(batcher))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            valid = executor.submit(post, server.server_address[1], make_request(4.0))
+            invalid = executor.submit(post, server.server_address[1], make_request(0.0))
+            (valid_status, valid_body), (invalid_status, invalid_body) = valid.result(), invalid.result()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert valid_status == 200
+    assert valid_body['breakeven_distance'] == 125000.0
+    assert invalid_status == 400
+    assert 'zero' in invalid_body['error']
@@ -1,11 +1,21 @@
 import streamlit as st
-from typing import List, Dict
+from typing import Dict
 import math
-import pandas as pd
-from defaults import SETTINGS_MAP
-from helpers import Currency, Settings, FuelUnit, MileageUnit, Distance, Mileage, FuelQuantity, FuelPrice, Car, DistanceUnit, list_all, convert_fuel_price
+from datetime import date
+import numpy as np
+from cache import memoize, persistable
+from exact import calculate_exact_breakeven_with_price_hike, calculate_exact_per_km_cost
+from fuel_prices import fuel_price_table
+from graph import ComputationGraph, Node, view
+from defaults import DRIVE_SEGMENTS, HEATMAP_MAX_CELLS, SETTINGS_MAP
+from lazy import lazy_import
+from helpers import Currency, Settings, FuelUnit, MileageUnit, Distance, Mileage, FuelQuantity, FuelPrice, Car, DistanceUnit, OwnershipCosts, DriveProfile, \
+                    FuelPriceSource, list_all, convert_fuel_price, convert_fuel_price_values
 
 
+# pandas is only needed once results are expanded into DataFrames, so it stays out of the first render
+pd = lazy_import("pandas")
+
 def set_page_header_format():
     st.set_page_config(
     page_title="Hybrid EV Break Even Calculator",
@@ -69,16 +79,37 @@ def collect_basic_details():
         selected_currency = Currency(value=selected_currency)
         defaults = SETTINGS_MAP.get(selected_currency.value)
 
+        # Regions only show up when the server has a fuel price table
+        price_table = fuel_price_table()
+        regions = price_table.regions(selected_currency.value) if price_table is not None else []
+        region = None
+        if regions:
+            region = st.selectbox("Fuel price region:", [None] + regions, format_func=lambda region: region or "None",
+                                  key="fuel_price_region")
+
     with fuel_unit:
         # Average fuel price input
         fuel_unit_options = sorted(list_all(FuelUnit))
         selected_fuel_unit = st.selectbox("Fuel Unit:", fuel_unit_options, index=fuel_unit_options.index(defaults.fuel_unit.value))
         selected_fuel_unit = FuelUnit(value=selected_fuel_unit)
+
+        fuel_price_source = None
+        if region is not None:
+            first_year, last_year = price_table.years(region)
+            start_year = st.number_input("Buying in year:", min_value=first_year, max_value=last_year, step=1,
+                                         value=min(max(date.today().year, first_year), last_year), key="fuel_price_start_year")
+            fuel_price_source = FuelPriceSource(region=region, start_year=start_year, table=price_table.fingerprint)
         
     with fuel_price:
         # Average fuel price input
         fuel_price_label = f"Avg fuel price / {selected_fuel_unit.name} ({selected_currency.value}):"
-        fuel_price = round(st.number_input(fuel_price_label, min_value=0.01, step=0.1, format="%.2f", value=float(defaults.fuel_price.value)), 2)
+        if fuel_price_source is None:
+            fuel_price = round(st.number_input(fuel_price_label, min_value=0.01, step=0.1, format="%.2f", value=float(defaults.fuel_price.value)), 2)
+        else:
+            # The region's average over the first year, and its later years' in place of a fixed yearly increase
+            price_per_litre = price_table.yearly_prices(region, start_year, 1, 0.0)[0]
+            fuel_price = round(float(convert_fuel_price_values(price_per_litre, FuelUnit.L, selected_fuel_unit)), 2)
+            st.number_input(fuel_price_label, format="%.2f", value=fuel_price, disabled=True)
         fuel_price = FuelPrice(value=fuel_price, per_unit=selected_fuel_unit)
         
         # Simulate fuel price increase checkbox
@@ -107,6 +138,8 @@ def collect_basic_details():
             annual_distance_label = f"Average annual distance driven ({defaults.distance_unit.value})"
             annual_distance = st.number_input(annual_distance_label, min_value=0, step=1000, key="annual_distance", value=int(defaults.annual_distance.get_value_in(defaults.distance_unit).value))
         annual_distance = Distance(value=annual_distance, unit=defaults.distance_unit)
+
+    exact_arithmetic = st.checkbox("Exact arithmetic (round only for display)", value=False, key="exact_arithmetic")
     
     settings = Settings(
         currency                = selected_currency,
@@ -119,11 +152,13 @@ def collect_basic_details():
         def_hybrid_car_price    = defaults.def_hybrid_car_price,
         def_fuel_car_price      = defaults.def_fuel_car_price,
         car_price_step          = defaults.car_price_step,
-        distance_unit           = defaults.distance_unit
+        distance_unit           = defaults.distance_unit,
+        exact_arithmetic        = exact_arithmetic,
+        fuel_price_source       = fuel_price_source,
     )
     return settings
     
-def collect_car_details(car_type: str, settings: Settings) -> Car:    
+def collect_car_details(car_type: str, settings: Settings, graph: ComputationGraph = None) -> Car:    
     st.write(f"#### {car_type.replace('_', ' ')} Details")
 
     if car_type.lower() == 'hybrid_car':
@@ -148,7 +183,11 @@ def collect_car_details(car_type: str, settings: Settings) -> Car:
         mileage = Mileage(value=mileage, unit=settings.mileage_unit)
     
     car = Car(type=car_type, price=price, mileage=mileage)
-    car.cost_per_km = calculate_per_km_cost(car, settings.fuel_price)
+    if graph is None:
+        car.cost_per_km = _per_km_cost(car, settings.fuel_price, settings.exact_arithmetic)
+    else:
+        graph.set_input(car_type, car)
+        car = graph.get(f"{car_type}.priced")
     
     with standardized_mileage:
         # standardized_mileage_label = f"Standardized mileage ({car.standardized_mileage.unit.value}):"
@@ -158,6 +197,61 @@ def collect_car_details(car_type: str, settings: Settings) -> Car:
         st.text_input(per_km_cost_label, value=f"{car.cost_per_km / Distance(value=1, unit=DistanceUnit.km).get_value_in(settings.distance_unit).value:.2f}", key=f"{car_type}-costpkm", disabled=True)
     return car
 
+def collect_ownership_costs(car_type: str, settings: Settings) -> OwnershipCosts:
+    st.write(f"##### {car_type.replace('_', ' ')}")
+    financing, insurance, servicing, battery, resale = st.columns(5)
+    with financing:
+        financed_pct = st.number_input("Financed (%)", min_value=0.0, max_value=100.0, step=10.0, value=0.0, key=f"{car_type}-financed")
+        loan_rate_pct = st.number_input("Loan interest (% / year)", min_value=0.0, max_value=30.0, step=0.5, value=7.0, key=f"{car_type}-loan-rate")
+        loan_years = st.number_input("Loan term (years)", min_value=1, max_value=10, step=1, value=5, key=f"{car_type}-loan-years")
+    with insurance:
+        insurance_per_year = st.number_input(f"Insurance ({settings.currency.value} / year)", min_value=0.0, step=100.0, value=0.0, key=f"{car_type}-insurance")
+    with servicing:
+        servicing_per_year = st.number_input(f"Servicing ({settings.currency.value} / year)", min_value=0.0, step=100.0, value=0.0, key=f"{car_type}-servicing")
+    with battery:
+        battery_replacement_cost = st.number_input(f"Battery replacement ({settings.currency.value})", min_value=0.0, step=500.0, value=0.0, key=f"{car_type}-battery-cost")
+        battery_replacement_year = st.number_input("Replaced in year (0 = never)", min_value=0, max_value=30, step=1, value=0, key=f"{car_type}-battery-year")
+    with resale:
+        include_resale = st.checkbox("Sell at the end", value=False, key=f"{car_type}-resale")
+        depreciation_pct = st.number_input("Depreciation (% / year)", min_value=0.0, max_value=50.0, step=1.0, value=15.0,
+                                           key=f"{car_type}-depreciation", disabled=not include_resale)
+
+    return OwnershipCosts(
+        financed_pct             = financed_pct,
+        loan_rate_pct            = loan_rate_pct,
+        loan_years               = loan_years,
+        insurance_per_year       = insurance_per_year,
+        servicing_per_year       = servicing_per_year,
+        battery_replacement_cost = battery_replacement_cost,
+        battery_replacement_year = battery_replacement_year,
+        depreciation_pct         = depreciation_pct if include_resale else None,
+    )
+
+def collect_segment_mileage(car: Car, settings: Settings) -> Dict[str, Mileage]:
+    st.write(f"##### {car.type.replace('_', ' ')}")
+    segment_mileage = {}
+    for segment, col in zip(DRIVE_SEGMENTS, st.columns(len(DRIVE_SEGMENTS))):
+        with col:
+            mileage = st.number_input(f"{segment.title()} mileage ({settings.mileage_unit.value}):", step=1.0,
+                                      value=float(car.mileage.value), key=f"{car.type}-{segment}-mileage")
+        segment_mileage[segment] = Mileage(value=mileage, unit=settings.mileage_unit)
+    return segment_mileage
+
+def collect_drive_profile(settings: Settings) -> DriveProfile:
+    # Defaults spread the annual distance evenly over the days, mostly in the city
+    daily_distance = settings.annual_distance.get_value_in(settings.distance_unit).value / 365.25
+    distances = {}
+    for day_type in ['weekday', 'weekend']:
+        distances[day_type] = {}
+        for (segment, share), col in zip(zip(DRIVE_SEGMENTS, [0.6, 0.4]), st.columns(len(DRIVE_SEGMENTS))):
+            with col:
+                distances[day_type][segment] = st.number_input(f"{segment.title()} {settings.distance_unit.value} per {day_type} day:",
+                                                               min_value=0.0, step=5.0, value=round(daily_distance * share, 1),
+                                                               key=f"{day_type}-{segment}-distance")
+    num_years = st.number_input("Years to simulate", min_value=1, max_value=50, step=1, value=settings.ownership_years, key="drive_profile_years")
+    return DriveProfile(weekday=distances['weekday'], weekend=distances['weekend'], distance_unit=settings.distance_unit,
+                        num_days=math.ceil(num_years * 365.25))
+
 def calculate_distance_fuel_car_could_travel(fuel_car: Car, hybrid_car: Car, settings: Settings):
     price_difference = hybrid_car.price - fuel_car.price
     fuel_could_have_purchased = FuelQuantity(value=price_difference/settings.fuel_price.value, unit=settings.fuel_price.per_unit)
@@ -166,50 +260,282 @@ def calculate_distance_fuel_car_could_travel(fuel_car: Car, hybrid_car: Car, set
     
     return (distance_could_have_travelled, fuel_could_have_purchased)
 
+@memoize(persist=True)
 def calculate_breakeven_distance(fuel_car: Car, hybrid_car: Car, settings: Settings):
     price_difference = hybrid_car.price - fuel_car.price
     breakeven_distance = Distance(value=price_difference / (fuel_car.cost_per_km - hybrid_car.cost_per_km),
                                   unit=DistanceUnit.km)
     return breakeven_distance
 
+@memoize(persist=True)
+def calculate_breakeven_with_price_hike(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    price_difference = hybrid_car.price - fuel_car.price
+    hybrid_kmpl = hybrid_car.standardized_mileage.value
+    fuel_car_kmpl = fuel_car.standardized_mileage.value
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    fuel_price = settings.fuel_price.get_value_per(FuelUnit.L).value
+
+    # Fuel prices never fall, so break-even comes no later than it would at today's price
+    if settings.fuel_price_source is not None:
+        # Past the first year, a region's prices can dip below it. The bound is the lowest of the rounded
+        # yearly prices solved against, through the first year past the table, after which they only rise
+        source = settings.fuel_price_source
+        num_table_years = fuel_price_table().years(source.region)[1] - source.start_year + 2
+        fuel_price = min(fuel_price, yearly_fuel_price_schedule(settings, num_table_years).min())
+    flat_breakeven_km = price_difference / (fuel_price * (1 / fuel_car_kmpl - 1 / hybrid_kmpl))
+    num_years = math.ceil((math.floor(flat_breakeven_km) + 2) / annual_km)
+    yearly_fuel_price = yearly_fuel_price_schedule(settings, num_years)
+
+    km, year = solve_breakeven_km(price_difference, hybrid_kmpl, fuel_car_kmpl, yearly_fuel_price, annual_km)
+    if year == 0:
+        raise ValueError(f"Break-even is not reached within {num_years} years")
+
+    distance = Distance(value=int(km), unit=DistanceUnit.km)
+    years = np.round(year - 1 + ((km % annual_km) / annual_km), 1)
+    fuel_price = FuelPrice(value=yearly_fuel_price[year - 1], per_unit=FuelUnit.L)
+    return (distance, years, fuel_price)
+
+def solve_breakeven_km(price_difference, hybrid_kmpl, fuel_car_kmpl, yearly_fuel_price: np.ndarray, annual_km):
+    """Returns the first whole (km, year) where fuel savings exceed the price difference, year 0 if never.
+
+    Savings are linear in km within a year, so each year holds at most one candidate and only years are
+    scanned. Scenario inputs may be (n, 1) arrays against (n, years) prices.
+    """
+    price_difference, hybrid_kmpl, fuel_car_kmpl, annual_km = (np.asarray(value, dtype=float) for value in
+                                                              (price_difference, hybrid_kmpl, fuel_car_kmpl, annual_km))
+    yearly_fuel_price = np.asarray(yearly_fuel_price, dtype=float)
+    year = np.arange(1, yearly_fuel_price.shape[-1] + 1)
+    first_km = np.floor((year - 1) * annual_km) + 1
+    last_km = np.floor(year * annual_km)
+
+    def savings(km):
+        return km * (1 / fuel_car_kmpl) * yearly_fuel_price - km * (1 / hybrid_kmpl) * yearly_fuel_price
+
+    with np.errstate(divide='ignore'):
+        threshold = price_difference / (yearly_fuel_price * (1 / fuel_car_kmpl - 1 / hybrid_kmpl))
+    km = np.maximum(np.floor(threshold) + 1, first_km)
+    # Nudge by a km where floating point disagrees with the per-km comparison
+    km = np.where((km - 1 >= first_km) & (savings(km - 1) > price_difference), km - 1, km)
+    km = np.where(savings(km) > price_difference, km, km + 1)
+
+    crossed = km <= last_km
+    idx = np.argmax(crossed, axis=-1)
+    found = np.take_along_axis(crossed, np.expand_dims(idx, -1), -1).squeeze(-1)
+    km = np.take_along_axis(np.broadcast_to(km, crossed.shape), np.expand_dims(idx, -1), -1).squeeze(-1)
+    return (np.where(found, km, 0).astype(np.int64), np.where(found, idx + 1, 0))
+
+@memoize(persist=True)
 def calculate_detailed_cost(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    distance, years, fuel_price = calculate_breakeven_with_price_hike(fuel_car, hybrid_car, settings)
     rough_breakeven_distance = calculate_breakeven_distance(fuel_car, hybrid_car, settings)
-    rough_num_years = math.ceil(rough_breakeven_distance.get_value_in(DistanceUnit.km).value / settings.annual_distance.get_value_in(DistanceUnit.km).value)
-    
-    fuel_price_df = calculate_yearly_fuel_price(settings.fuel_price.get_value_per(FuelUnit.L), settings.pct_fuel_price_hike, rough_num_years)
+    segments = calculate_cost_segments(fuel_car, hybrid_car, settings,
+                                       max(math.ceil(rough_breakeven_distance.get_value_in(DistanceUnit.km).value), distance.value + 1))
+    return (segments, distance, years, fuel_price)
 
-    data = []
-    for distance_period in range(1, math.ceil(rough_breakeven_distance.get_value_in(DistanceUnit.km).value)):
-        year_period = math.ceil(distance_period / settings.annual_distance.get_value_in(DistanceUnit.km).value)
-        data.append((distance_period, year_period))
+def calculate_cost_segments(fuel_car: Car, hybrid_car: Car, settings: Settings, max_km: int,
+                            yearly_fuel_price: np.ndarray = None) -> "CostSegments":
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    if yearly_fuel_price is None:
+        yearly_fuel_price = yearly_fuel_price_schedule(settings, math.ceil(max_km / annual_km))
+    return CostSegments(hybrid_car.standardized_mileage.value, fuel_car.standardized_mileage.value,
+                        yearly_fuel_price, annual_km, max_km)
 
-    df = pd.DataFrame(data, columns=['km', 'year'])
-    df = pd.merge(df, fuel_price_df, on='year')
-    
-    df["Hybrid Cost"] = df.km * (1 / hybrid_car.standardized_mileage.value) * df.fuel_price
-    df["Non-Hybrid Cost"] = df.km * (1 / fuel_car.standardized_mileage.value) * df.fuel_price
-    df['cost_difference'] = df["Non-Hybrid Cost"] - df["Hybrid Cost"]
-    df['year_pct'] = round(df['year'] - 1 + ((df.km % settings.annual_distance.get_value_in(DistanceUnit.km).value) / settings.annual_distance.get_value_in(DistanceUnit.km).value), 1)
+def calculate_cost_series(fuel_car: Car, hybrid_car: Car, settings: Settings, max_km: int,
+                          max_points: int = None, breakeven_km: int = None, yearly_fuel_price: np.ndarray = None):
+    segments = calculate_cost_segments(fuel_car, hybrid_car, settings, max_km, yearly_fuel_price)
+    return segments.to_frame(max_points=max_points, breakeven_km=breakeven_km)
 
-    tmp_df = df.where(df.cost_difference > hybrid_car.price - fuel_car.price).dropna().head(1)
-    distance = Distance(value=int(tmp_df.km.iloc[0]), unit=DistanceUnit.km)
-    years = tmp_df.year_pct.iloc[0]
-    fuel_price = FuelPrice(value=tmp_df.fuel_price.iloc[0], per_unit= FuelUnit.L)
+def downsample_km(max_km: int, annual_km: float, max_points: int, breakeven_km: int = None) -> np.ndarray:
+    """Picks at most `max_points` kms in [1, max_km) keeping both sides of every fuel price change and the break-even km."""
+    num_years = math.ceil(max_km / annual_km)
+    # Each price change needs two points, so keep them to half the budget by skipping years when there are many
+    year_step = max(1, math.ceil(4 * num_years / max_points))
+    year_end_km = np.floor(np.arange(year_step, num_years, year_step) * annual_km).astype(np.int64)
+    key_km = np.concatenate([year_end_km, year_end_km + 1, [1, max_km - 1]])
+    if breakeven_km is not None:
+        key_km = np.append(key_km, breakeven_km)
 
-    return (df, distance, years, fuel_price)
+    num_even = max(max_points - len(key_km), 2)
+    even_km = np.linspace(1, max_km - 1, num_even).round().astype(np.int64)
+    km = np.unique(np.concatenate([even_km, key_km]))
+    return km[(km >= 1) & (km < max_km)]
 
-def calculate_yearly_fuel_price(fuel_price: FuelPrice, pc_increase: float, num_years: int):
-    fuel_unit = fuel_price.per_unit.name
-    fuel_price = fuel_price.value
-    
-    data = []
-    for period_number in range(1, num_years + 1):
-        data.append((period_number, round(fuel_price, 2), fuel_unit))
-        fuel_price *= (1 + pc_increase/100)
+def simulate_detailed_cost(hybrid_kmpl: float, fuel_car_kmpl: float, yearly_fuel_price: np.ndarray,
+                           annual_km: float, km: np.ndarray) -> Dict[str, np.ndarray]:
+    year = np.ceil(km / annual_km).astype(np.int64)
+    # Kilometres past the last priced year are dropped, as the year merge used to do
+    km, year = km[year <= len(yearly_fuel_price)], year[year <= len(yearly_fuel_price)]
+    fuel_price = yearly_fuel_price[year - 1]
+
+    hybrid_cost = km * (1 / hybrid_kmpl) * fuel_price
+    fuel_car_cost = km * (1 / fuel_car_kmpl) * fuel_price
+    year_pct = np.round(year - 1 + ((km % annual_km) / annual_km), 1)
+
+    return {
+        'km': km,
+        'year': year,
+        'fuel_price': fuel_price,
+        'hybrid_cost': hybrid_cost,
+        'fuel_car_cost': fuel_car_cost,
+        'cost_difference': fuel_car_cost - hybrid_cost,
+        'year_pct': year_pct,
+    }
+
+@persistable
+class CostSegments:
+    """Cost comparison over [1, max_km) kept as one segment per year, so memory is O(years).
+
+    Within a year every km is costed at that year's price per litre, so costs are linear in km and
+    per-km points are only computed when `to_frame` expands them.
+    """
 
-    return pd.DataFrame(data, columns=['year', 'fuel_price', 'fuel_unit'])
+    def __init__(self, hybrid_kmpl: float, fuel_car_kmpl: float, yearly_fuel_price: np.ndarray, annual_km: float,
+                 max_km: int, fuel_unit: FuelUnit = FuelUnit.L):
+        self.hybrid_kmpl = hybrid_kmpl
+        self.fuel_car_kmpl = fuel_car_kmpl
+        self.annual_km = annual_km
+        self.max_km = int(max_km)
+        self.fuel_unit = fuel_unit
+        # Only the years that [1, max_km) reaches
+        self.yearly_fuel_price = np.asarray(yearly_fuel_price, dtype=float)[:max(math.ceil((self.max_km - 1) / annual_km), 0)]
 
+    @property
+    def num_years(self) -> int:
+        return len(self.yearly_fuel_price)
+
+    @property
+    def nbytes(self) -> int:
+        return self.yearly_fuel_price.nbytes
+
+    def segments(self) -> "pd.DataFrame":
+        """One row per year with its km range and per-km costs."""
+        year = np.arange(1, self.num_years + 1)
+        return pd.DataFrame({
+            'year': year.astype(np.int16),
+            'first_km': (np.floor((year - 1) * self.annual_km) + 1).astype(np.int64),
+            'last_km': np.minimum(np.floor(year * self.annual_km), self.max_km - 1).astype(np.int64),
+            'fuel_price': self.yearly_fuel_price.astype(np.float32),
+            'hybrid_cost_per_km': (self.yearly_fuel_price / self.hybrid_kmpl).astype(np.float32),
+            'fuel_car_cost_per_km': (self.yearly_fuel_price / self.fuel_car_kmpl).astype(np.float32),
+        })
+
+    def km(self, resolution_km: int = 1, max_points: int = None, breakeven_km: int = None) -> np.ndarray:
+        if max_points:
+            return downsample_km(self.max_km, self.annual_km, max_points, breakeven_km)
+        return np.arange(1, self.max_km, resolution_km, dtype=np.int64)
+
+    def to_frame(self, resolution_km: int = 1, max_points: int = None, breakeven_km: int = None,
+                 chunk_size: int = 1 << 16) -> "pd.DataFrame":
+        """Per-point series every `resolution_km`, or downsampled to `max_points`, with compact dtypes.
+
+        Points are costed `chunk_size` at a time into the compact columns, so float64 temporaries stay small.
+        """
+        km = self.km(resolution_km, max_points, breakeven_km)
+        # Kilometres past the last priced year are dropped, as in simulate_detailed_cost
+        km = km[np.ceil(km / self.annual_km) <= self.num_years]
+        columns = {
+            'km': km.astype(np.int32 if self.max_km <= np.iinfo(np.int32).max else np.int64),
+            'year': np.empty(len(km), dtype=np.int16),
+            'fuel_price': np.empty(len(km), dtype=np.float32),
+            'Hybrid Cost': np.empty(len(km), dtype=np.float32),
+            'Non-Hybrid Cost': np.empty(len(km), dtype=np.float32),
+            'cost_difference': np.empty(len(km), dtype=np.float32),
+            'year_pct': np.empty(len(km), dtype=np.float32),
+        }
+        for start in range(0, len(km), chunk_size):
+            arrays = simulate_detailed_cost(self.hybrid_kmpl, self.fuel_car_kmpl, self.yearly_fuel_price, self.annual_km,
+                                            km[start:start + chunk_size])
+            for column, key in [('year', 'year'), ('fuel_price', 'fuel_price'), ('Hybrid Cost', 'hybrid_cost'),
+                                ('Non-Hybrid Cost', 'fuel_car_cost'), ('cost_difference', 'cost_difference'),
+                                ('year_pct', 'year_pct')]:
+                columns[column][start:start + chunk_size] = arrays[key]
+        return pd.DataFrame(columns, copy=False)
+
+def calculate_yearly_fuel_price_array(fuel_price, pc_increase, num_years: int) -> np.ndarray:
+    """Yearly price schedule; array inputs of shape (n,) give an (n, num_years) schedule."""
+    fuel_price = np.asarray(fuel_price, dtype=float)[..., None]
+    pc_increase = np.asarray(pc_increase, dtype=float)[..., None]
+    factors = np.broadcast_to(1 + pc_increase/100, np.broadcast_shapes(fuel_price.shape, pc_increase.shape)[:-1] + (num_years,)).copy()
+    factors[..., 0] = fuel_price[..., 0]
+    return np.round(np.cumprod(factors, axis=-1), 2)
+
+def yearly_fuel_price_schedule(settings: Settings, num_years: int, pct_increase: float = None) -> np.ndarray:
+    """Per-litre fuel price of each year: the region's yearly prices when a fuel price source is picked,
+    continuing at the yearly hike past the end of its table, otherwise today's price compounding by it."""
+    if pct_increase is None:
+        pct_increase = settings.pct_fuel_price_hike
+    source = settings.fuel_price_source
+    if source is None:
+        return calculate_yearly_fuel_price_array(settings.fuel_price.get_value_per(FuelUnit.L).value, pct_increase, num_years)
+    yearly_fuel_price = fuel_price_table().yearly_prices(source.region, source.start_year, num_years, pct_increase)
+    return yearly_fuel_price if settings.exact_arithmetic else np.round(yearly_fuel_price, 2)
+
+@memoize()
 def calculate_per_km_cost(car: Car, fuel_price: FuelPrice):
-    mileage_in_kmpl = car.mileage.get_value_in(MileageUnit.KMPL).value
+    mileage_in_kmpl = car.standardized_mileage.value
     fuel_price_in_l = convert_fuel_price(fuel_price, FuelUnit.L).value
-    return round(fuel_price_in_l / mileage_in_kmpl, 2)
\ No newline at end of file
+    return round(fuel_price_in_l / mileage_in_kmpl, 2)
+
+
+def _per_km_cost(car: Car, fuel_price: FuelPrice, exact_arithmetic: bool) -> float:
+    if exact_arithmetic:
+        return calculate_exact_per_km_cost(car, fuel_price)
+    return calculate_per_km_cost(car, fuel_price)
+
+def _hike_breakeven(fuel_car: Car, hybrid_car: Car, settings: Settings):
+    if settings.exact_arithmetic:
+        return calculate_exact_breakeven_with_price_hike(fuel_car, hybrid_car, settings)
+    return calculate_breakeven_with_price_hike(fuel_car, hybrid_car, settings)
+
+def _chart_horizon_km(breakeven_distance: Distance, hike_breakeven) -> int:
+    return max(math.ceil(breakeven_distance.value), int(hike_breakeven[0].value) + 1)
+
+def _yearly_fuel_price_for(settings: Settings, max_km: int) -> np.ndarray:
+    annual_km = settings.annual_distance.get_value_in(DistanceUnit.km).value
+    return yearly_fuel_price_schedule(settings, math.ceil(max_km / annual_km))
+
+@memoize(persist=True)
+def calculate_chart_series(segments: CostSegments, hike_breakeven, max_points: int) -> "pd.DataFrame":
+    """Downsampled cost comparison, as charted on the page."""
+    return segments.to_frame(max_points=max_points, breakeven_km=int(hike_breakeven[0].value))
+
+def breakeven_heatmap_axes(settings: Settings):
+    """(fuel_prices, fuel_unit, annual_distances, distance_unit) of the sensitivity heatmap."""
+    # Axes follow the currency defaults rather than the inputs, so the cached grid survives input changes
+    defaults = SETTINGS_MAP.get(settings.currency.value)
+    steps = int(HEATMAP_MAX_CELLS ** 0.5)
+    default_fuel_price = defaults.fuel_price.get_value_per(settings.fuel_unit).value
+    default_distance = defaults.annual_distance.get_value_in(settings.distance_unit).value
+    fuel_prices = tuple(np.round(np.linspace(0.5, 2, steps) * default_fuel_price, 2).tolist())
+    annual_distances = tuple((np.round(np.linspace(0.25, 2.5, steps) * default_distance, -2)).tolist())
+    return (fuel_prices, settings.fuel_unit, annual_distances, settings.distance_unit)
+
+# Derived values of the page, over the inputs 'settings', 'Hybrid_Car', 'Fuel_Car' and 'chart_max_points'.
+# Settings and cars are narrowed through views so that, for example, a new yearly hike % leaves the
+# per-km costs and flat break-even alone.
+PAGE_NODES = {
+    'fuel_price': Node(lambda settings: settings.fuel_price, 'settings'),
+    'exact_arithmetic': Node(lambda settings: settings.exact_arithmetic, 'settings'),
+    'settings[hike]': view('settings', key=lambda settings: (settings.fuel_price, settings.pct_fuel_price_hike, settings.annual_distance,
+                                                             settings.exact_arithmetic, settings.fuel_price_source)),
+    'price_gap': Node(lambda hybrid_car, fuel_car: hybrid_car.price - fuel_car.price, 'Hybrid_Car', 'Fuel_Car'),
+}
+for car_type in ['Hybrid_Car', 'Fuel_Car']:
+    PAGE_NODES.update({
+        f'{car_type}.mileage': view(car_type, key=lambda car: car.mileage),
+        f'{car_type}.standardized_mileage': Node(lambda car: car.standardized_mileage, f'{car_type}.mileage'),
+        f'{car_type}.cost_per_km': Node(_per_km_cost, f'{car_type}.mileage', 'fuel_price', 'exact_arithmetic'),
+        f'{car_type}.priced': Node(lambda car, cost_per_km: car.model_copy(update={'cost_per_km': cost_per_km}),
+                                   car_type, f'{car_type}.cost_per_km'),
+    })
+PAGE_NODES.update({
+    # calculate_breakeven_distance only reads the cars
+    'breakeven_distance': Node(lambda fuel_car, hybrid_car: calculate_breakeven_distance(fuel_car, hybrid_car, None),
+                               'Fuel_Car.priced', 'Hybrid_Car.priced'),
+    'hike_breakeven': Node(_hike_breakeven, 'Fuel_Car.priced', 'Hybrid_Car.priced', 'settings[hike]'),
+    'chart_horizon_km': Node(_chart_horizon_km, 'breakeven_distance', 'hike_breakeven'),
+    'yearly_fuel_price': Node(_yearly_fuel_price_for, 'settings[hike]', 'chart_horizon_km'),
+    'cost_segments': Node(calculate_cost_segments, 'Fuel_Car.priced', 'Hybrid_Car.priced', 'settings[hike]',
+                          'chart_horizon_km', 'yearly_fuel_price'),
+    'chart_series': Node(calculate_chart_series, 'cost_segments', 'hike_breakeven', 'chart_max_points'),
+})
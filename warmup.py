@@ -0,0 +1,88 @@
+"""Fill the persistent cache with the page's results for each currency's default inputs.
+
+    python warmup.py        # e.g. once per deploy, before the replicas take traffic
+
+Server processes also start this in the background on their first page load.
+"""
+import logging
+import threading
+import time
+
+from cache import persistent_cache
+from defaults import CHART_MAX_POINTS, SETTINGS_MAP
+from graph import ComputationGraph
+from helpers import Car, Distance, FuelPrice, Mileage, MileageUnit, Settings
+from lazy import lazy_import
+
+# Servers import this module on startup, but only the warm-up thread needs the calculations and pandas
+batch = lazy_import("batch")
+utils = lazy_import("utils")
+
+LOGGER = logging.getLogger(__name__)
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def default_page_inputs(currency: str, sim_fuel_price_hike: bool):
+    """The (fuel_car, hybrid_car, settings) the page builds before any input is changed."""
+    defaults = SETTINGS_MAP[currency]
+    settings = Settings(
+        currency=defaults.currency,
+        fuel_price=FuelPrice(value=round(float(defaults.fuel_price.value), 2), per_unit=defaults.fuel_unit),
+        sim_fuel_price_hike=sim_fuel_price_hike,
+        pct_fuel_price_hike=2.5 if sim_fuel_price_hike else 0.0,
+        mileage_unit=defaults.mileage_unit,
+        fuel_unit=defaults.fuel_unit,
+        annual_distance=Distance(value=int(defaults.annual_distance.get_value_in(defaults.distance_unit).value),
+                                 unit=defaults.distance_unit),
+        def_hybrid_car_price=defaults.def_hybrid_car_price,
+        def_fuel_car_price=defaults.def_fuel_car_price,
+        car_price_step=defaults.car_price_step,
+        distance_unit=defaults.distance_unit,
+    )
+    cars = []
+    for car_type, price, l_100km in [('Fuel_Car', defaults.def_fuel_car_price, 6), ('Hybrid_Car', defaults.def_hybrid_car_price, 4)]:
+        mileage = Mileage(value=l_100km, unit=MileageUnit.L_100KM).get_value_in(settings.mileage_unit)
+        car = Car(type=car_type, price=round(float(price), 2), mileage=Mileage(value=float(mileage.value), unit=settings.mileage_unit))
+        cars.append(car.model_copy(update={'cost_per_km': utils.calculate_per_km_cost(car, settings.fuel_price)}))
+    return (*cars, settings)
+
+
+def warm_persistent_cache():
+    started = time.perf_counter()
+    for currency in SETTINGS_MAP:
+        for sim_fuel_price_hike in [False, True]:
+            fuel_car, hybrid_car, settings = default_page_inputs(currency, sim_fuel_price_hike)
+            if hybrid_car.price <= fuel_car.price or hybrid_car.standardized_mileage.value <= fuel_car.standardized_mileage.value:
+                continue
+            utils.calculate_breakeven_distance(fuel_car, hybrid_car, None)
+            batch.calculate_breakeven_grid(hybrid_car.price, hybrid_car.mileage, fuel_car.price, fuel_car.mileage,
+                                           *utils.breakeven_heatmap_axes(settings),
+                                           settings.pct_fuel_price_hike if settings.sim_fuel_price_hike else 0.0)
+            if sim_fuel_price_hike:
+                # The page's chart, through the same graph nodes
+                graph = ComputationGraph(utils.PAGE_NODES, {})
+                for name, value in [('settings', settings), ('chart_max_points', CHART_MAX_POINTS),
+                                    ('Fuel_Car', fuel_car), ('Hybrid_Car', hybrid_car)]:
+                    graph.set_input(name, value)
+                graph.get('chart_series')
+    LOGGER.info("Warmed the persistent cache in %.2fs", time.perf_counter() - started)
+
+
+def start_warmup():
+    """Warms the persistent cache on a background thread, once per process."""
+    global _started
+    with _started_lock:
+        if _started or persistent_cache() is None:
+            return
+        _started = True
+    threading.Thread(target=warm_persistent_cache, name="cache-warmup", daemon=True).start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if persistent_cache() is None:
+        raise SystemExit("The persistent cache is disabled, set BREAKEVEN_CACHE_PATH")
+    warm_persistent_cache()
+    print(persistent_cache().stats())